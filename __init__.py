@@ -1,10 +1,23 @@
-from .backend_kivy import FigureCanvasKivy,\
-                                FigureManagerKivy, RendererKivy,\
-                                GraphicsContextKivy, NavigationToolbar2Kivy,\
-                                MPLKivyApp
-from .backend_kivyagg import FigureCanvasKivyAgg
-
-__all__ = (FigureCanvasKivy.__name__, FigureManagerKivy.__name__,
-           RendererKivy.__name__, GraphicsContextKivy.__name__,
-           NavigationToolbar2Kivy.__name__, MPLKivyApp.__name__,
-           FigureCanvasKivyAgg.__name__)
+# The canvases are imported on first use, so that modules without kivy
+# graphics such as `offscreen` can be imported before the window is set up:
+#
+#     from kivy.garden.matplotlib import offscreen
+#     offscreen.setup_headless()
+#     from kivy.garden.matplotlib import FigureCanvasKivy
+
+__all__ = ('FigureCanvasKivy', 'FigureManagerKivy', 'RendererKivy',
+           'GraphicsContextKivy', 'NavigationToolbar2Kivy', 'MPLKivyApp',
+           'FigureCanvasKivyAgg', 'FigureCanvasKivyHybrid')
+
+_modules = {'FigureCanvasKivyAgg': 'backend_kivyagg',
+            'FigureCanvasKivyHybrid': 'backend_kivyhybrid'}
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError('module %r has no attribute %r' % (__name__,
+                                                                 name))
+    from importlib import import_module
+    module = import_module('.' + _modules.get(name, 'backend_kivy'),
+                           __name__)
+    return getattr(module, name)
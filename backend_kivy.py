@@ -112,10 +112,13 @@ If a change is done on the figure an update can be performed using
 
 The plot can be exported to png with
 :meth:`~kivy.ext.mpl.backend_kivyagg.FigureCanvasKivyAgg.print_png`, as an
-argument receives the `filename`.::
+argument receives the `filename` or a file-like object. `print_jpg`,
+`print_tif` and `print_raw` write the other formats.::
 
     # export to png
     canvas.print_png("my_plot.png")
+    buf = io.BytesIO()
+    canvas.print_png(buf)
 
 2. Example of a pyplot application using matplotlib instructions::
 
@@ -234,6 +237,124 @@ is released, `motion_notify_event` which is raised when the mouse is on motion,
     fig.canvas.mpl_connect('figure_leave_event', figure_leave)
     fig.canvas.mpl_connect('close_event', close)
 
+
+Fast picking on large data
+--------------------------
+
+Picking goes through the `contains()` method of every artist which is a linear
+scan over the points. For large scatters and lines a grid index in display
+space can be enabled per artist. The `pick_event` is then raised as usual with
+the indices of the points under the touch::
+
+    points = ax.scatter(x, y)
+    canvas.enable_spatial_index(points, radius=5)
+    canvas.mpl_connect('pick_event', lambda event: print(event.ind))
+
+    # hover inspection
+    artist, ind, dist = canvas.nearest_point(event.x, event.y, 10)
+
+
+Off-screen canvases
+-------------------
+
+A canvas which is not visible in the window, e.g. scrolled out of a
+ScrollView, in a screen of a ScreenManager which is not the current one or
+with no size, does not render when asked to draw. It is drawn once when it
+becomes visible again. The counts are kept in `draw_stats`::
+
+    canvas.draw_stats
+    {'rendered': 3, 'deferred': 41}
+
+Set `defer_offscreen_draws` to False to always render.
+
+`draw_idle`, and the resizes and moves of the widgets, do not draw
+immediately but submit the canvas to `draw_scheduler`. It draws the pending
+canvases once per frame within a shared time budget, visible and recently
+touched canvases first, so many charts updated in the same tick do not freeze
+the UI::
+
+    from kivy.garden.matplotlib.backend_kivy import draw_scheduler
+    draw_scheduler.budget = 0.010  # seconds per frame
+    draw_scheduler.stats['queue_depth']
+    canvas.draw_stats['max_latency']
+
+
+Streaming data
+--------------
+
+Lines fed continuously with samples can be added with
+:meth:`FigureCanvasKivy.add_stream`. The samples are kept in ring buffers of
+fixed capacity and pushed to the render once per frame. As long as the limits
+of the axes do not change only the new segments are drawn::
+
+    trace = canvas.add_stream(ax, capacity=5000, autoscroll=10.0, color='g')
+    trace.append(t, value)
+    canvas.stream_stats['samples_per_second']
+
+Data produced on other threads is handed to the canvas through a staging
+buffer; it is applied on the main thread on the next frame::
+
+    staging = canvas.add_producer(lambda data: line.set_data(*data))
+    staging.put((x, y))  # from any thread
+    staging.stats
+
+
+Large recordings
+----------------
+
+Arrays too large to be drawn sample by sample, e.g. memory mapped files, are
+plotted with :func:`largedata.plot_memmap`. Only the samples inside the x
+limits are read and they are reduced to per pixel envelopes::
+
+    from kivy.garden.matplotlib.largedata import plot_memmap
+    plot_memmap(ax, np.load('recording.npy', mmap_mode='r'), dx=1e-3)
+
+Images too large for a texture are shown with
+:meth:`FigureCanvasKivy.add_tiled_image`: only the tiles of the view are
+computed, at the resolution of the zoom, on a background thread::
+
+    canvas.add_tiled_image(ax, np.load('scan.npy', mmap_mode='r'),
+                           cmap='gray', max_bytes=256 << 20)
+
+Scalar fields updated often are shown with :func:`shader_image.imshow_scalar`.
+The data is uploaded as 16 bit codes and colormapped by a shader, so changing
+the color limits or the colormap does not upload the data again::
+
+    from kivy.garden.matplotlib.shader_image import imshow_scalar
+    image = imshow_scalar(ax, field, cmap='viridis')
+    image.set_clim(-1, 1)
+
+Figures with many thick or dashed lines are drawn faster with
+`canvas.batch_lines = True`: the strokes of the same style are packed in a
+few meshes and expanded by shaders, see :mod:`line_engine`.
+
+On slow devices `canvas.adaptive_quality = True` lowers the quality of the
+renders done during an interaction while they are over the frame budget (no
+antialiasing, more path simplification, no text, smaller agg renders) and
+restores it once the canvas is idle, see :mod:`quality`.
+
+Without a display, :meth:`FigureCanvasKivy.render_offscreen` draws a canvas
+into an Fbo of a given size and returns the pixels as a numpy array, and
+:meth:`FigureCanvasKivy.save_offscreen` writes them as PNG. Call
+:func:`offscreen.setup_headless` before importing kivy to use a hidden
+window.
+
+:meth:`FigureCanvasKivy.savefig_async` saves a figure from a worker process
+and returns a job that can be cancelled, the UI keeps running while a large
+figure is rendered and encoded. The toolbar saves with it.
+
+A draw is skipped when the last render is still up to date: no artist of the
+figure changed since, the figure was not drawn by another renderer and its
+pixel size, dpi and quality tier did not change. The changes are counted by
+the stale callback of the figure, `figure.stale` alone is cleared by any
+draw, e.g. a `print_png`. The skipped draws are counted in
+`draw_stats['skipped']` and `canvas.draw(force=True)` always renders.
+
+The textures created by all the canvases are accounted in the process wide
+`texture_budget`. Setting `texture_budget.max_bytes` evicts the renders of the
+canvases not shown, least recently drawn first, when it is exceeded; they are
+rendered again when shown, see :mod:`texture_budget`.
+
 '''
 
 from __future__ import (absolute_import, division, print_function,
@@ -248,9 +369,8 @@ from matplotlib.backend_bases import RendererBase, GraphicsContextBase,\
     FigureManagerBase, FigureCanvasBase, NavigationToolbar2, TimerBase
 from matplotlib.figure import Figure
 from matplotlib.transforms import Bbox, Affine2D
-from matplotlib.backend_bases import ShowBase, Event
-from matplotlib.backends.backend_agg import FigureCanvasAgg
-from matplotlib.mathtext import MathTextParser
+from matplotlib.backend_bases import ShowBase, Event, LocationEvent, \
+    MouseEvent
 from matplotlib import rcParams
 from hashlib import md5
 from matplotlib import _path
@@ -264,17 +384,12 @@ from kivy.app import App
 from kivy.graphics.texture import Texture
 from kivy.graphics import Rectangle
 from kivy.uix.widget import Widget
-from kivy.uix.label import Label
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.behaviors import FocusBehavior
-from kivy.uix.actionbar import ActionBar, ActionView, \
-                                ActionButton, ActionToggleButton, \
-                                ActionPrevious, ActionOverflow, ActionSeparator
 from kivy.base import EventLoop
 from kivy.core.text import Label as CoreLabel
-from kivy.core.image import Image
 from kivy.graphics import Color, Line
-from kivy.graphics import Rotate, Translate
+from kivy.graphics import Rotate, Translate, Scale
 from kivy.graphics.instructions import InstructionGroup
 from kivy.graphics.tesselator import Tesselator
 from kivy.graphics.context_instructions import PopMatrix, PushMatrix
@@ -282,18 +397,10 @@ from kivy.graphics import StencilPush, StencilPop, StencilUse,\
                                 StencilUnUse
 from kivy.logger import Logger
 from kivy.graphics import Mesh
+from kivy.graphics import Fbo, ClearColor, ClearBuffers
 from kivy.resources import resource_find
 from kivy.uix.stencilview import StencilView
-from kivy.core.window import Window
-from kivy.uix.button import Button
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.relativelayout import RelativeLayout
-from kivy.uix.popup import Popup
 from kivy.properties import ObjectProperty
-from kivy.uix.textinput import TextInput
-from kivy.lang import Builder
-from kivy.logger import Logger
 from kivy.clock import Clock
 from distutils.version import LooseVersion
 
@@ -302,17 +409,93 @@ _mpl_ge_2_0 = LooseVersion(matplotlib.__version__) >= LooseVersion('2.0.0')
 
 import numpy as np
 import io
-import textwrap
 import uuid
 import numbers
+import weakref
+from collections import OrderedDict
 from functools import partial
+from timeit import default_timer
 from math import cos, sin, pi
+from spatial_index import ArtistIndex
+from streaming import StreamTrace
+from feeds import StagingBuffer
+from tiled_image import TiledImage
+from shader_image import ShaderImageState
+from line_engine import LineEngine
+from triangulate import Triangulator, TriangleMeshes
+from quality import AdaptiveQuality
+from texture_budget import TextureBudget
+from offscreen import ensure_gl_context, read_pixels, write_png
 
 kivy.require('1.9.1')
 
 toolbar = None
 my_canvas = None
 
+# The window, the toolbar and dialog widgets, the export module and the
+# mathtext parser are imported or created on first use: importing
+# kivy.core.window opens the window, which the canvases do not need until
+# they are shown. matplotlib.mathtext and kivy.lang are still imported, by
+# matplotlib.backend_bases and kivy.base.
+
+SAVE_DIALOG_KV = '''\
+<SaveDialog>:
+    text_input: text_input
+    BoxLayout:
+        size: root.size
+        pos: root.pos
+        orientation: "vertical"
+        FileChooserListView:
+            id: filechooser
+            on_selection: text_input.text = self.selection and\
+            self.selection[0] or ''
+
+        TextInput:
+            id: text_input
+            size_hint_y: None
+            height: 30
+            multiline: False
+
+        BoxLayout:
+            size_hint_y: None
+            height: 30
+            Button:
+                text: "Cancel"
+                on_release: root.cancel()
+
+            Button:
+                text: "Save"
+                on_release: root.save(filechooser.path,\
+                text_input.text)
+'''
+
+_save_dialog_loaded = False
+_mathtext_parser = None
+
+
+def _window():
+    '''Return the kivy Window, creating it on the first call.'''
+    from kivy.core.window import Window
+    return Window
+
+
+def load_save_dialog():
+    '''Compile the kv rules of the SaveDialog, once per process.'''
+    global _save_dialog_loaded
+    if not _save_dialog_loaded:
+        from kivy.lang import Builder
+        Builder.load_string(SAVE_DIALOG_KV)
+        _save_dialog_loaded = True
+
+
+def mathtext_parser():
+    '''Return the agg MathTextParser shared by the renderers.'''
+    global _mathtext_parser
+    if _mathtext_parser is None:
+        from matplotlib.mathtext import MathTextParser
+        _mathtext_parser = MathTextParser("agg")
+    return _mathtext_parser
+
 
 class SaveDialog(FloatLayout):
     save = ObjectProperty(None)
@@ -386,11 +569,25 @@ def new_figure_manager_given_figure(num, figure):
     return manager
 
 
+def _tesselate(points):
+    '''Fallback of the `triangulator` for the polygons the ear clipping
+       could not triangulate.
+    '''
+    tess = Tesselator()
+    tess.add_contour(points.ravel().tolist())
+    if not tess.tesselate():
+        Logger.warning("Tesselator didn't work, drawing polygon as a fan")
+        return None
+    return tess.meshes
+
+triangulator = Triangulator(fallback=_tesselate)
+
+
 class RendererKivy(RendererBase):
     '''The kivy renderer handles drawing/rendering operations. A RendererKivy
-       should be initialized with a FigureCanvasKivy widget. On initialization
-       a MathTextParser is instantiated to generate math text inside a
-       FigureCanvasKivy widget. Additionally a list to store clip_rectangles
+       should be initialized with a FigureCanvasKivy widget. A MathTextParser,
+       shared by all the renderers and created on first use, generates math
+       text inside a FigureCanvasKivy widget. Additionally a list to store clip_rectangles
        is defined for elements that need to be clipped inside a rectangle such
        as axes. The rest of the render is performed using kivy graphics
        instructions.
@@ -400,11 +597,15 @@ class RendererKivy(RendererBase):
         self.widget = widget
         self.dpi = widget.figure.dpi
         self._markers = {}
-        #  Can be enhanced by using TextToPath matplotlib, textpath.py
-        self.mathtext_parser = MathTextParser("agg")
         self.list_goraud_triangles = []
         self.clip_rectangles = []
         self.labels_inside_plot = []
+        self.line_engine = getattr(widget, 'line_engine', None)
+
+    @property
+    def mathtext_parser(self):
+        #  Can be enhanced by using TextToPath matplotlib, textpath.py
+        return mathtext_parser()
 
     def contains(self, widget, x, y):
         '''Returns whether or not a point is inside the widget. The value
@@ -508,36 +709,40 @@ class RendererKivy(RendererBase):
                 return idx
         return -1
 
-    def get_path_instructions(self, gc, polygons, closed=False, rgbFace=None):
+    def get_path_instructions(self, gc, polygons, closed=False, rgbFace=None,
+                              stroke=True):
         '''With a graphics context and a set of polygons it returns a list
            of InstructionGroups required to render the path.
         '''
         instructions_list = []
-        points_line = []
+        offset = np.array([self.widget.x, self.widget.y], dtype=float)
         for polygon in polygons:
-            for x, y in polygon:
-                x = x + self.widget.x
-                y = y + self.widget.y
-                points_line += [float(x), float(y), ]
-            tess = Tesselator()
-            tess.add_contour(points_line)
-            if not tess.tesselate():
-                Logger.warning("Tesselator didn't work :(")
-                return
+            if not len(polygon):
+                continue
+            points = np.asarray(polygon, dtype=float) + offset
+            points_line = points.ravel().tolist()
+            x, y = points_line[-2:]
+            # Only faces need triangles, strokes use the points.
+            if rgbFace is not None:
+                tess = triangulator.triangulate(points)
+            else:
+                tess = TriangleMeshes([])
             newclip = self.handle_clip_rectangle(gc, x, y)
             if newclip > -1:
                 instructions_list.append((self.clip_rectangles[newclip],
                         self.get_graphics(gc, tess, points_line, rgbFace,
-                                          closed=closed)))
+                                          closed=closed, stroke=stroke)))
             else:
                 instructions_list.append((self.widget,
                         self.get_graphics(gc, tess, points_line, rgbFace,
-                                          closed=closed)))
+                                          closed=closed, stroke=stroke)))
         return instructions_list
 
-    def get_graphics(self, gc, polygons, points_line, rgbFace, closed=False):
+    def get_graphics(self, gc, polygons, points_line, rgbFace, closed=False,
+                     stroke=True):
         '''Return an instruction group which contains the necessary graphics
-           instructions to draw the respective graphics.
+           instructions to draw the respective graphics. The line is left out
+           if stroke is False.
         '''
         instruction_group = InstructionGroup()
         if isinstance(gc.line['dash_list'], tuple):
@@ -549,8 +754,10 @@ class RendererKivy(RendererBase):
                     instruction_group.add(Mesh(
                         vertices=vertices,
                         indices=indices,
-                        mode=str("triangle_fan")
+                        mode=str(polygons.mode)
                     ))
+        if not stroke:
+            return instruction_group
         instruction_group.add(Color(*gc.get_rgb()))
         if _mpl_ge_1_5 and (not _mpl_ge_2_0) and closed:
             points_poly_line = points_line[:-2]
@@ -588,6 +795,7 @@ class RendererKivy(RendererBase):
         rows, cols, image_str = im.as_rgba_str()
         texture = Texture.create(size=(w, h))
         texture.blit_buffer(image_str, colorfmt='rgba', bufferfmt='ubyte')
+        self.account_texture('image', texture)
         if clippath is None:
             with self.widget.canvas:
                 Color(1.0, 1.0, 1.0, 1.0)
@@ -609,6 +817,66 @@ class RendererKivy(RendererBase):
                 widget.canvas.add(StencilUnUse())
                 widget.canvas.add(StencilPop())
 
+    def texture_from_rgba(self, rgba):
+        '''Upload a (rows, cols, 4) uint8 array, first row at the bottom, to
+           a new Texture.
+        '''
+        h, w = rgba.shape[:2]
+        texture = Texture.create(size=(w, h))
+        texture.blit_buffer(np.ascontiguousarray(rgba).tobytes(),
+                            colorfmt='rgba', bufferfmt='ubyte')
+        self.account_texture('image', texture)
+        return texture
+
+    def account_texture(self, purpose, texture):
+        '''Register a texture used by the render in the `texture_budget`.'''
+        canvas = getattr(self.widget, 'figure_canvas', self.widget)
+        texture_budget.add(canvas, purpose, texture)
+
+    def draw_texture(self, gc, texture, x, y, w, h):
+        '''Draw an already uploaded texture in the rectangle x, y, w, h given
+           in matplotlib coordinates.
+        '''
+        with self.widget.canvas:
+            Color(1.0, 1.0, 1.0, 1.0)
+            Rectangle(texture=texture, pos=(self.widget.x + x,
+                                            self.widget.y + y), size=(w, h))
+
+    def draw_scalar_image(self, gc, image):
+        '''Draw a :class:`shader_image.ScalarImage`. The scalar data and the
+           colormap are kept as textures on the image between draws and the
+           colormapping is done by a fragment shader, the part of the image
+           outside of its clip box is cut through the texture coordinates.
+        '''
+        state = image._shader_state
+        if state is None:
+            state = image._shader_state = ShaderImageState()
+        state.update(image)
+        self.account_texture('image', state.data_texture)
+        self.account_texture('image', state.lut_texture)
+        left, right, bottom, top = image.get_extent()
+        if image.origin == 'upper':
+            bottom, top = top, bottom
+        # Display coordinates of the texture corners (u, v) = (0, 0), (1, 1).
+        (px0, py0), (px1, py1) = image.get_transform().transform(
+            [(left, bottom), (right, top)])
+        if px0 == px1 or py0 == py1:
+            return
+        clip = image.get_clip_box() or image.axes.bbox
+        x0 = max(min(px0, px1), clip.x0)
+        x1 = min(max(px0, px1), clip.x1)
+        y0 = max(min(py0, py1), clip.y0)
+        y1 = min(max(py0, py1), clip.y1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        u0, u1 = [(x - px0) / (px1 - px0) for x in (x0, x1)]
+        v0, v1 = [(y - py0) / (py1 - py0) for y in (y0, y1)]
+        state.color.a = gc.get_alpha()
+        state.rectangle.pos = (self.widget.x + x0, self.widget.y + y0)
+        state.rectangle.size = (x1 - x0, y1 - y0)
+        state.rectangle.tex_coords = (u0, v0, u1, v0, u1, v1, u0, v1)
+        self.widget.canvas.add(state.context)
+
     def draw_text(self, gc, x, y, s, prop, angle, ismath=False, mtext=None):
         '''Render text that is displayed in the canvas. The position x, y is
            given in matplotlib coordinates. A `GraphicsContextKivy` is given
@@ -668,6 +936,7 @@ class RendererKivy(RendererBase):
             if self.weight_as_number(prop.get_weight()) > 500:
                 plot_text.bold = True
             plot_text.refresh()
+            self.account_texture('text', plot_text.texture)
             with self.widget.canvas:
                 if isinstance(angle, float):
                     PushMatrix()
@@ -694,6 +963,7 @@ class RendererKivy(RendererBase):
             texture.blit_buffer(ftimage.as_rgba_str(), colorfmt='rgba',
                                 bufferfmt='ubyte')
         texture.flip_vertical()
+        self.account_texture('text', texture)
         with self.widget.canvas:
             Rectangle(texture=texture, pos=(x, y), size=(w, h))
 
@@ -711,11 +981,39 @@ class RendererKivy(RendererBase):
         else:
             polygons = path.to_polygons(transform, self.widget.width,
                                         self.widget.height)
+        engine = self.line_engine
+        if engine is not None and engine.accepts(gc):
+            self.draw_batched_path(gc, polygons, rgbFace, engine)
+            return
         list_canvas_instruction = self.get_path_instructions(gc, polygons,
                                     closed=True, rgbFace=rgbFace)
         for widget, instructions in list_canvas_instruction:
             widget.canvas.add(instructions)
 
+    def draw_batched_path(self, gc, polygons, rgbFace, engine):
+        '''Draw the faces of the polygons as in :meth:`draw_path` and give
+           their strokes to the :class:`line_engine.LineEngine` of the
+           canvas, which packs them with the neighbouring strokes of the
+           same style.
+        '''
+        if rgbFace is not None:
+            list_canvas_instruction = self.get_path_instructions(
+                gc, polygons, closed=True, rgbFace=rgbFace, stroke=False)
+            for widget, instructions in list_canvas_instruction or []:
+                widget.canvas.add(instructions)
+        style = engine.style(self, gc)
+        offset = np.array([self.widget.x, self.widget.y], dtype=float)
+        for polygon in polygons:
+            points = np.asarray(polygon, dtype=float) + offset
+            if len(points) < 2:
+                continue
+            x, y = points[-1]
+            newclip = self.handle_clip_rectangle(gc, x, y)
+            target = self.clip_rectangles[newclip] if newclip > -1 \
+                else self.widget
+            closed = len(points) > 2 and np.array_equal(points[0], points[-1])
+            engine.add(target.canvas, style, points, closed=closed)
+
     def draw_markers(self, gc, marker_path, marker_trans, path,
         trans, rgbFace=None):
         '''Markers graphics instructions are stored on a dictionary and
@@ -756,6 +1054,13 @@ class RendererKivy(RendererBase):
     def flipy(self):
         return False
 
+    def close_group(self, s):
+        # The figure closes its group right before firing `draw_event`, the
+        # batched strokes are built first so that the callbacks, e.g. one
+        # caching a background with `copy_from_bbox`, see the whole render.
+        if s == 'figure' and self.line_engine is not None:
+            self.line_engine.flush()
+
     def _convert_path(self, path, transform=None, clip=None, simplify=None,
                       sketch=None):
         if clip:
@@ -861,40 +1166,11 @@ class NavigationToolbar2Kivy(Widget, NavigationToolbar2):
         NavigationToolbar2.__init__(self, canvas)
         if not hasattr(self, 'fbind'):
             self.fbind = self.bind
+        from kivy.uix.actionbar import ActionBar
         self.actionbar = ActionBar(pos_hint={'top': 1.0})
         self.canvas_figure = canvas
         self.rubberband_color = (1.0, 0.0, 0.0, 1.0)
         self.lastrect = None
-        self.save_dialog = Builder.load_string(textwrap.dedent('''\
-            <SaveDialog>:
-                text_input: text_input
-                BoxLayout:
-                    size: root.size
-                    pos: root.pos
-                    orientation: "vertical"
-                    FileChooserListView:
-                        id: filechooser
-                        on_selection: text_input.text = self.selection and\
-                        self.selection[0] or ''
-
-                    TextInput:
-                        id: text_input
-                        size_hint_y: None
-                        height: 30
-                        multiline: False
-
-                    BoxLayout:
-                        size_hint_y: None
-                        height: 30
-                        Button:
-                            text: "Cancel"
-                            on_release: root.cancel()
-
-                        Button:
-                            text: "Save"
-                            on_release: root.save(filechooser.path,\
-                            text_input.text)
-            '''))
 
     def _init_toolbar(self):
         '''A Toolbar is created with an ActionBar widget in which buttons are
@@ -902,6 +1178,9 @@ class NavigationToolbar2Kivy(Widget, NavigationToolbar2):
            properties are given by matplotlib.
         '''
         print('IS THIS EXECUTING')
+        from kivy.uix.actionbar import ActionView, ActionButton, \
+            ActionToggleButton, ActionPrevious, ActionOverflow, \
+            ActionSeparator
         basedir = os.path.join(rcParams['datapath'], 'images')
         actionview = ActionView()
         actionprevious = ActionPrevious(title="Navigation", with_previous=False)
@@ -933,14 +1212,33 @@ class NavigationToolbar2Kivy(Widget, NavigationToolbar2):
 
     def show_save(self):
         '''Displays a popup widget to perform a save operation.'''
+        from kivy.uix.popup import Popup
+        load_save_dialog()
         content = SaveDialog(save=self.save, cancel=self.dismiss_popup)
         self._popup = Popup(title="Save file", content=content,
                             size_hint=(0.9, 0.9))
         self._popup.open()
 
     def save(self, path, filename):
-        self.canvas.export_to_png(os.path.join(path, filename))
+        '''Save the figure in the background, see
+           :meth:`FigureCanvasKivy.savefig_async`. The job is kept in
+           `save_job` and can be cancelled.
+        '''
         self.dismiss_popup()
+        try:
+            self.save_job = self.canvas_figure.savefig_async(
+                os.path.join(path, filename),
+                on_progress=self.on_save_progress)
+        except Exception as error:
+            Logger.error('Save: %s could not be saved: %s' % (filename,
+                                                              error))
+
+    def on_save_progress(self, job, state):
+        if state == 'failed':
+            Logger.error('Save: %s could not be saved: %s' % (job.filename,
+                                                              job.error))
+        else:
+            Logger.info('Save: %s %s' % (job.filename, state))
 
     def save_figure(self, *args):
         self.show_save()
@@ -1065,12 +1363,42 @@ class TimerKivy(TimerBase):
     * callbacks: Stores list of (func, args) tuples that will be called
         upon timer events. This list can be manipulated directly, or the
         functions add_callback and remove_callback can be used.
+    * frame_sync: Boolean flag. If True the timer is checked on every frame
+        of the Kivy Clock and fires at most once per frame, on the first
+        frame past its deadline. Intervals that were missed because a
+        callback or a render overran are skipped instead of accumulating,
+        so an animation drops frames rather than falling behind.
+    * stats: Dictionary with the timing of the timer: `target_interval` and
+        `actual_interval` (last measured) in milliseconds,
+        `mean_interval`, `lateness` and `max_lateness` in milliseconds,
+        `ticks` and `skipped` (missed intervals in frame_sync mode).
     '''
+    def __init__(self, *args, **kwargs):
+        self.frame_sync = kwargs.pop('frame_sync', False)
+        self._timer = None
+        self._deadline = None
+        self._last_tick = None
+        self.stats = {}
+        self.reset_stats()
+        super(TimerKivy, self).__init__(*args, **kwargs)
+
+    def reset_stats(self):
+        self.stats.update(target_interval=0.0, actual_interval=0.0,
+                          mean_interval=0.0, lateness=0.0, max_lateness=0.0,
+                          ticks=0, skipped=0)
+
     def _timer_start(self):
         # Need to stop it, otherwise we potentially leak a timer id that will
         # never be stopped.
         self._timer_stop()
-        self._timer = Clock.schedule_interval(self._on_timer, self._interval / 1000.0)
+        self.stats['target_interval'] = float(self._interval)
+        self._last_tick = Clock.get_time()
+        if self.frame_sync:
+            self._deadline = self._last_tick + self._interval / 1000.0
+            self._timer = Clock.schedule_interval(self._on_frame, 0)
+        else:
+            self._timer = Clock.schedule_interval(self._on_timer,
+                                                  self._interval / 1000.0)
 
     def _timer_stop(self):
         if self._timer is not None:
@@ -1083,29 +1411,539 @@ class TimerKivy(TimerBase):
             self._timer_stop()
             self._timer_start()
 
+    def _record_tick(self, now, lateness):
+        stats = self.stats
+        actual = (now - self._last_tick) * 1000.0
+        self._last_tick = now
+        stats['ticks'] += 1
+        stats['actual_interval'] = actual
+        if stats['ticks'] == 1:
+            stats['mean_interval'] = actual
+        else:
+            stats['mean_interval'] += 0.1 * (actual - stats['mean_interval'])
+        stats['lateness'] = lateness * 1000.0
+        stats['max_lateness'] = max(stats['max_lateness'], lateness * 1000.0)
+
+    def _on_frame(self, dt):
+        '''Called on every frame in frame_sync mode. Fires the callbacks once
+           if the deadline has passed and moves the deadline past the current
+           frame, counting the intervals that were skipped.
+        '''
+        now = Clock.get_time()
+        if now < self._deadline:
+            return
+        interval = max(self._interval / 1000.0, 1e-6)
+        lateness = now - self._deadline
+        missed = int(lateness // interval)
+        self._deadline += (missed + 1) * interval
+        self.stats['skipped'] += missed
+        self._record_tick(now, lateness - missed * interval)
+        super(TimerKivy, self)._on_timer()
+
     def _on_timer(self, dt):
+        now = Clock.get_time()
+        self._record_tick(now, max(dt - self._interval / 1000.0, 0.0))
         super(TimerKivy, self)._on_timer()
 
 
+class WindowEventRouter(object):
+    '''Process wide dispatcher of the Window `mouse_pos` events. Instead of
+       every FigureCanvasKivy binding to the Window, the canvases register
+       here and only the canvas under the pointer (and the one the pointer
+       just left) receive the event. The window rectangles of the canvases
+       are kept in a coarse grid of `cell_size` pixels which is rebuilt
+       lazily when a canvas moves, resizes, is reparented or the window is
+       resized. Canvases are referenced weakly so a destroyed canvas is
+       dropped automatically. The Window is bound when a registered canvas
+       is first added to a parent, so creating a canvas does not open the
+       window, and the binding is released when no canvas is left, through
+       the window bound, without importing it again: canvases can be
+       collected while the interpreter shuts down.
+    '''
+
+    cell_size = 128
+
+    def __init__(self):
+        self._canvases = []
+        self._grid = {}
+        self._dirty = True
+        self._bound_window = None
+        self._hovered = None
+
+    def __len__(self):
+        return len(self._canvases)
+
+    def register(self, canvas):
+        ref = weakref.ref(canvas, self._on_collected)
+        if ref in self._canvases:
+            return
+        self._canvases.append(ref)
+        canvas.bind(pos=self.invalidate, size=self.invalidate,
+                    parent=self._on_parent)
+        self._on_parent(canvas, canvas.parent)
+
+    def _on_parent(self, canvas, parent):
+        self.invalidate()
+        if parent is not None and self._bound_window is None:
+            window = _window()
+            window.bind(mouse_pos=self._on_mouse_pos,
+                        on_resize=self.invalidate)
+            self._bound_window = window
+
+    def unregister(self, canvas):
+        ref = weakref.ref(canvas)
+        if ref in self._canvases:
+            canvas.unbind(pos=self.invalidate, size=self.invalidate,
+                          parent=self._on_parent)
+            self._remove(ref)
+
+    def invalidate(self, *args):
+        '''Mark the rectangles as outdated. Should be called by containers
+           that move canvases without changing their pos, e.g. a Scatter.
+        '''
+        self._dirty = True
+
+    def _on_collected(self, ref):
+        self._remove(ref)
+
+    def _remove(self, ref):
+        if ref in self._canvases:
+            self._canvases.remove(ref)
+        if self._hovered == ref:
+            self._hovered = None
+        self.invalidate()
+        window = self._bound_window
+        if not self._canvases and window is not None:
+            window.unbind(mouse_pos=self._on_mouse_pos,
+                          on_resize=self.invalidate)
+            self._bound_window = None
+
+    def _rebuild(self):
+        self._grid = {}
+        size = self.cell_size
+        for order, ref in enumerate(self._canvases):
+            canvas = ref()
+            if canvas is None or canvas.get_root_window() is None:
+                continue
+            if canvas.width <= 0 or canvas.height <= 0:
+                continue
+            x0, y0 = canvas.to_window(canvas.x, canvas.y)
+            x1, y1 = canvas.to_window(canvas.right, canvas.top)
+            for cx in range(int(x0 // size), int(x1 // size) + 1):
+                for cy in range(int(y0 // size), int(y1 // size) + 1):
+                    self._grid.setdefault((cx, cy), []).append((order, ref))
+        self._dirty = False
+
+    def canvas_at(self, x, y):
+        '''Return the registered canvas under the window point x, y or None.
+           If several canvases overlap the last registered one wins.
+        '''
+        if self._dirty:
+            self._rebuild()
+        size = self.cell_size
+        cell = self._grid.get((int(x // size), int(y // size)), ())
+        for order, ref in reversed(cell):
+            canvas = ref()
+            if canvas is not None and \
+                    canvas.collide_point(*canvas.to_widget(x, y)):
+                return canvas
+        return None
+
+    def _on_mouse_pos(self, window, pos):
+        canvas = self.canvas_at(*pos)
+        hovered = self._hovered() if self._hovered is not None else None
+        if hovered is not None and hovered is not canvas:
+            hovered._on_mouse_pos(window, pos)
+        if canvas is not None:
+            canvas._on_mouse_pos(window, pos)
+            self._hovered = weakref.ref(canvas)
+        else:
+            self._hovered = None
+
+
+event_router = WindowEventRouter()
+
+
+class RegionKivy(object):
+    '''Saved region of a FigureCanvasKivy render returned by
+       :meth:`FigureCanvasKivy.copy_from_bbox`. `extents` are the pixel
+       bounds (x0, y0, x1, y1) of the region relative to the widget.
+    '''
+
+    def __init__(self, fbo, texture, extents, widget_size):
+        self.fbo = fbo
+        self.texture = texture
+        self.extents = extents
+        self.widget_size = widget_size
+
+
+def _bbox_to_pixels(bbox, size):
+    '''Return the integer extents of bbox clipped to a (width, height) area.
+    '''
+    x0, y0, x1, y1 = bbox.extents
+    w, h = int(size[0]), int(size[1])
+    x0 = min(max(int(np.floor(x0)), 0), w)
+    y0 = min(max(int(np.floor(y0)), 0), h)
+    x1 = min(max(int(np.ceil(x1)), x0), w)
+    y1 = min(max(int(np.ceil(y1)), y0), h)
+    return x0, y0, x1, y1
+
+
+class DrawScheduler(object):
+    '''Process wide queue of the draw requests of the canvases. Canvases
+       submit themselves through `draw_idle` and the queue is processed once
+       per frame: canvases visible in the window and canvases that were
+       recently touched are drawn first, then the oldest requests. Draws stop
+       once `budget` seconds have been spent in the frame (at least one draw
+       is done per frame) and the rest are spread across the next frames.
+       Requests from the same canvas are coalesced while they wait.
+
+       `stats` holds the current and maximum queue depth, the number of
+       frames and draws processed and the frames that ran over budget. The
+       latency between the first request and the draw is recorded per canvas
+       in its `draw_stats`.
+    '''
+
+    budget = 0.008
+    interaction_timeout = 1.0
+
+    def __init__(self):
+        self._pending = OrderedDict()
+        self._event = None
+        self.stats = {'queue_depth': 0, 'max_queue_depth': 0, 'frames': 0,
+                      'draws': 0, 'over_budget': 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, canvas):
+        ref = weakref.ref(canvas)
+        if ref not in self._pending:
+            self._pending[ref] = default_timer()
+        depth = len(self._pending)
+        self.stats['queue_depth'] = depth
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'],
+                                            depth)
+        if self._event is None:
+            self._event = Clock.schedule_once(self._process, 0)
+
+    def cancel(self, canvas):
+        self._pending.pop(weakref.ref(canvas), None)
+        self.stats['queue_depth'] = len(self._pending)
+
+    def _priority(self, item):
+        ref, submitted = item
+        canvas = ref()
+        if canvas is None:
+            return (0, 0, submitted)
+        now = Clock.get_time()
+        interacting = now - canvas._last_interaction < \
+            self.interaction_timeout
+        return (0 if canvas.is_visible_in_window() else 1,
+                0 if interacting else 1, submitted)
+
+    def _process(self, *args):
+        self._event = None
+        start = default_timer()
+        drawn = 0
+        for ref, submitted in sorted(self._pending.items(),
+                                     key=self._priority):
+            if drawn and default_timer() - start >= self.budget:
+                break
+            del self._pending[ref]
+            canvas = ref()
+            if canvas is None:
+                continue
+            canvas.draw()
+            drawn += 1
+            latency = default_timer() - submitted
+            canvas.draw_stats['latency'] = latency
+            canvas.draw_stats['max_latency'] = max(
+                canvas.draw_stats['max_latency'], latency)
+        elapsed = default_timer() - start
+        self.stats['frames'] += 1
+        self.stats['draws'] += drawn
+        if elapsed > self.budget:
+            self.stats['over_budget'] += 1
+        self.stats['queue_depth'] = len(self._pending)
+        if self._pending:
+            self._event = Clock.schedule_once(self._process, 0)
+
+
+draw_scheduler = DrawScheduler()
+
+texture_budget = TextureBudget()
+
+
+class StaleWatch(object):
+    '''Stale callback of the figures drawn by the canvases. Every change of
+       an artist of the figure increments `generation`, then the callback
+       replaced, e.g. the one of pyplot, is called.
+    '''
+
+    def __init__(self, chained=None):
+        self.chained = chained
+        self.generation = 0
+
+    def __call__(self, artist, val):
+        self.generation += 1
+        if self.chained is not None:
+            self.chained(artist, val)
+
+
+def _figure_generation(figure):
+    '''Return the StaleWatch of figure, installed if the stale callback was
+       replaced, and its generation.
+    '''
+    watch = figure.stale_callback
+    if not isinstance(watch, StaleWatch):
+        watch = figure.stale_callback = StaleWatch(watch)
+    return watch, watch.generation
+
+
 class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
     '''FigureCanvasKivy class. See module documentation for more information.
     '''
 
+    timer_frame_sync = False
+
+    # When True a draw requested while the widget is not visible in the
+    # window is postponed until it becomes visible. The number of renders
+    # and of postponed draws is counted in `draw_stats`.
+    defer_offscreen_draws = True
+
+    # When True the strokes drawn by `draw_path` are packed by style in the
+    # vertex buffers of a `line_engine.LineEngine` instead of one `Line`
+    # per polygon. Its counters are in `line_engine.stats`.
+    batch_lines = False
+
+    # Seconds without size change after which a resized widget is rendered
+    # again. Until then the last render is stretched to the new size. The
+    # renders following a resize are counted in
+    # `draw_stats['resize_renders']`. With 0 every size change is rendered.
+    resize_settle_delay = 0.15
+
+    # When True the renders done while the canvas is touched step down
+    # through the quality tiers of `quality` (a `quality.AdaptiveQuality`)
+    # as long as they are over its budget. The full quality is restored once
+    # the canvas is idle.
+    adaptive_quality = False
+
     def __init__(self, figure, **kwargs):
-        Window.bind(mouse_pos=self._on_mouse_pos)
         self.bind(size=self._on_size_changed)
         self.bind(pos=self._on_pos_changed)
         self.entered_figure = True
         self.figure = figure
+        self._spatial_indexes = {}
+        self._restoring = False
+        self._visibility_event = None
+        self.draw_stats = {'rendered': 0, 'deferred': 0, 'latency': 0.0,
+                           'max_latency': 0.0, 'resize_renders': 0,
+                           'evicted': 0, 'skipped': 0}
+        self._render_geometry = None
+        self._render_key = None
+        self._render_generation = None
+        self._drawing = False
+        self._blitted = False
+        self._stretch = None
+        self._resize_event = None
+        self._resize_render = False
+        self.quality = AdaptiveQuality()
+        self._quality_event = None
+        self._last_interaction = float('-inf')
+        self._streams = []
+        self._stream_event = None
+        self._stream_views = {}
+        self.stream_stats = {'incremental': 0, 'full': 0, 'samples': 0,
+                             'samples_per_second': 0.0}
+        self._producers = []
+        self._producer_event = None
+        self._line_engine = None
+        self._renderer = None
         super(FigureCanvasKivy, self).__init__(figure=self.figure, **kwargs)
+        event_router.register(self)
+        self.mpl_connect('draw_event', self._on_draw_event)
 
-    def draw(self):
-        '''Draw the figure using the KivyRenderer
+    def draw(self, force=False):
+        '''Draw the figure using the KivyRenderer. The draw is skipped, and
+           counted in `draw_stats['skipped']`, if the last render is up to
+           date, unless force is True.
         '''
+        if not force and self._up_to_date():
+            self.draw_stats['skipped'] += 1
+            return
+        if self._defer_draw():
+            return
+        start = default_timer()
         self.clear_widgets()
         self.canvas.clear()
+        texture_budget.reset(self)
+        self._restoring = False
+        engine = self.line_engine
+        if engine is not None:
+            engine.begin()
         self._renderer = RendererKivy(self)
-        self.figure.draw(self._renderer)
+        self._drawing = True
+        try:
+            with self.quality.apply(self._renderer):
+                self.figure.draw(self._renderer)
+        finally:
+            self._drawing = False
+        if engine is not None:
+            engine.flush()
+        self._rendered(default_timer() - start)
+
+    def _rendered(self, elapsed):
+        '''Update the counters and the geometry of the last render, which
+           took `elapsed` seconds, and the quality tier of the next ones.
+        '''
+        self.draw_stats['rendered'] += 1
+        if self._resize_render:
+            self.draw_stats['resize_renders'] += 1
+            self._resize_render = False
+        self._render_geometry = (tuple(self.pos), tuple(self.size))
+        self._render_key = self._current_render_key()
+        # The changes made by the render itself, e.g. to the ticks, are
+        # part of it.
+        self._render_generation = _figure_generation(self.figure)
+        self._blitted = False
+        texture_budget.drawn(self)
+        if not self.adaptive_quality:
+            return
+        self.quality.record(elapsed, self._interacting())
+        if self.quality.tier and self._quality_event is None:
+            self._quality_event = Clock.schedule_once(
+                self._check_quality_idle, self.quality.idle_delay)
+
+    def _current_render_key(self):
+        '''What a render depends on besides the artists: the pixel size and
+           the dpi of the figure, the position of the widget and the quality
+           tier.
+        '''
+        return (tuple(int(v) for v in self.figure.bbox.size),
+                self.figure.dpi, tuple(self.pos), self.quality.tier)
+
+    def _up_to_date(self):
+        '''Return whether the displayed render matches the figure: no artist
+           changed since and the figure was not drawn by another renderer,
+           the render was not evicted nor replaced by blitted frames, and
+           the render key did not change.
+        '''
+        return (not self.figure.stale and not self._blitted and
+                self._render_geometry is not None and
+                self._render_generation ==
+                _figure_generation(self.figure) and
+                self._render_key == self._current_render_key())
+
+    def _on_draw_event(self, event):
+        # The figure was drawn with another renderer, e.g. given to
+        # `figure.draw`, and its stale flag cleared.
+        if not self._drawing:
+            self._render_generation = None
+
+    def _interacting(self):
+        return Clock.get_time() - self._last_interaction < \
+            self.quality.idle_delay
+
+    def _check_quality_idle(self, *args):
+        '''Restore the full quality and render again once the canvas is not
+           touched anymore.
+        '''
+        if self._interacting():
+            self._quality_event = Clock.schedule_once(
+                self._check_quality_idle, self.quality.idle_delay)
+            return
+        self._quality_event = None
+        if self.quality.restore():
+            self.draw_idle()
+
+    def evict_textures(self):
+        '''Drop the graphics instructions of the last render, and the
+           textures they hold. Called by the `texture_budget` when it is
+           over budget; the figure is rendered again when the canvas is
+           next visible.
+        '''
+        self.clear_widgets()
+        self.canvas.clear()
+        for image in self.figure.findobj(TiledImage):
+            image.drop_textures()
+        self._renderer = None
+        self._render_geometry = None
+        self.draw_stats['evicted'] += 1
+        self._watch_visibility()
+
+    @property
+    def line_engine(self):
+        '''The :class:`line_engine.LineEngine` of the canvas when
+           `batch_lines` is True, None otherwise.
+        '''
+        if not self.batch_lines:
+            return None
+        if self._line_engine is None:
+            self._line_engine = LineEngine()
+        return self._line_engine
+
+    def draw_idle(self, *args, **kwargs):
+        '''Request a draw from the shared `draw_scheduler`. The figure is
+           drawn on one of the next frames, within the frame time budget
+           shared by all the canvases.
+        '''
+        draw_scheduler.submit(self)
+
+    def is_visible_in_window(self):
+        '''Return whether part of the widget is shown in the window. The
+           widget is not visible when it is detached from the window (e.g. a
+           screen of a ScreenManager which is not the current one), when it
+           has no area or is transparent, or when it is scrolled out of the
+           window or out of a StencilView ancestor such as a ScrollView.
+        '''
+        if self.width <= 0 or self.height <= 0 or self.opacity == 0:
+            return False
+        window = self.get_root_window()
+        if window is None:
+            return False
+        x0, y0 = self.to_window(self.x, self.y)
+        x1, y1 = self.to_window(self.right, self.top)
+        left, bottom = max(x0, 0), max(y0, 0)
+        right, top = min(x1, window.width), min(y1, window.height)
+        parent = self.parent
+        while parent is not None and parent is not window:
+            if parent.opacity == 0:
+                return False
+            if isinstance(parent, StencilView):
+                px0, py0 = parent.to_window(parent.x, parent.y)
+                px1, py1 = parent.to_window(parent.right, parent.top)
+                left, bottom = max(left, px0), max(bottom, py0)
+                right, top = min(right, px1), min(top, py1)
+            parent = parent.parent
+        return right > left and top > bottom
+
+    def _defer_draw(self):
+        '''Return True if the draw has to be skipped because the widget is
+           not visible. The canvas is then marked as dirty and drawn as soon
+           as it becomes visible again. Draws are also skipped while the
+           widget is being resized, the canvas is drawn once the size
+           settled.
+        '''
+        if self._resize_event is not None:
+            return True
+        if not self.defer_offscreen_draws or self.is_visible_in_window():
+            return False
+        self.draw_stats['deferred'] += 1
+        self._watch_visibility()
+        return True
+
+    def _watch_visibility(self):
+        '''Draw the canvas as soon as it is visible in the window.'''
+        if self._visibility_event is None:
+            self._visibility_event = Clock.schedule_interval(
+                self._check_visibility, 0)
+
+    def _check_visibility(self, *args):
+        if self.is_visible_in_window():
+            Clock.unschedule(self._visibility_event)
+            self._visibility_event = None
+            self.draw_idle()
 
     def on_touch_down(self, touch):
         '''Kivy Event to trigger the following matplotlib events:
@@ -1119,6 +1957,7 @@ class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
         if super(FigureCanvasKivy, self).on_touch_down(touch):
             return True
         if self.collide_point(*touch.pos):
+            self._last_interaction = Clock.get_time()
             self.motion_notify_event(x, y, guiEvent=None)
 
             touch.grab(self)
@@ -1143,6 +1982,7 @@ class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
         y = newcoord[1]
         inside = self.collide_point(touch.x, touch.y)
         if inside:
+            self._last_interaction = Clock.get_time()
             self.motion_notify_event(x, y, guiEvent=None)
         if not inside and not self.entered_figure:
             self.leave_notify_event(guiEvent=None)
@@ -1152,6 +1992,190 @@ class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
             self.entered_figure = False
         return False
 
+    def enable_spatial_index(self, artist, radius=5.0, cell_size=16.0):
+        '''Index the points of `artist` (a Line2D or a Collection such as the
+           one returned by scatter) in display space. Picking on the artist
+           then uses the index instead of the per-point `contains()` scan.
+           `radius` is the pick tolerance in pixels. The index is rebuilt
+           lazily when the data or the transform of the artist change.
+        '''
+        index = ArtistIndex(artist, cell_size=cell_size)
+        self._spatial_indexes[artist] = index
+        artist.set_picker(index.picker(radius))
+        return index
+
+    def disable_spatial_index(self, artist):
+        '''Remove the index of `artist` and restore the default picking.
+        '''
+        if self._spatial_indexes.pop(artist, None) is not None:
+            artist.set_picker(None)
+
+    def query_radius(self, x, y, radius):
+        '''Return a list of (artist, indices) tuples for the indexed artists
+           with points within `radius` pixels of x, y given in matplotlib
+           coordinates.
+        '''
+        hits = []
+        for artist, index in self._spatial_indexes.items():
+            ind = index.query_radius(x, y, radius)
+            if len(ind):
+                hits.append((artist, ind))
+        return hits
+
+    def nearest_point(self, x, y, max_distance=float('inf')):
+        '''Return a tuple (artist, index, distance) with the indexed point
+           closest to x, y given in matplotlib coordinates, or
+           (None, None, inf) if there is none within `max_distance` pixels.
+           Useful for hover inspection from `motion_notify_event`.
+        '''
+        best = (None, None, float('inf'))
+        for artist, index in self._spatial_indexes.items():
+            i, dist = index.nearest(x, y, min(max_distance, best[2]))
+            if i is not None and dist < best[2]:
+                best = (artist, i, dist)
+        return best
+
+    def add_stream(self, ax, capacity, autoscroll=None, **line_kwargs):
+        '''Add a line to `ax` fed with samples through the returned
+           :class:`streaming.StreamTrace`. Only the last `capacity` samples
+           are kept. If `autoscroll` is given the x limits follow the data
+           with a window of that width. The keyword arguments are given to
+           the Line2D. The traces are flushed once per frame.
+        '''
+        trace = StreamTrace(ax, capacity, autoscroll=autoscroll, **line_kwargs)
+        self._streams.append(trace)
+        if self._stream_event is None:
+            self._stream_event = Clock.schedule_interval(
+                self.flush_streams, 0)
+        return trace
+
+    def remove_stream(self, trace):
+        '''Remove the trace and its line from the figure.
+        '''
+        self._streams.remove(trace)
+        trace.line.remove()
+        if not self._streams and self._stream_event is not None:
+            Clock.unschedule(self._stream_event)
+            self._stream_event = None
+        self.draw_idle()
+
+    def get_renderer(self):
+        '''Return the RendererKivy of the current render, on which artists
+           can be drawn with `Axes.draw_artist` before a :meth:`blit`. A
+           renderer is created if the figure was not drawn yet.
+        '''
+        if self._renderer is None:
+            self._renderer = RendererKivy(self)
+        return self._renderer
+
+    def _blit_renderer(self):
+        '''Renderer holding the current render, on which artists can be drawn
+           before a :meth:`blit`.
+        '''
+        return self._renderer
+
+    def _axes_view(self, ax):
+        return (tuple(ax.viewLim.bounds), tuple(ax.bbox.bounds))
+
+    def flush_streams(self, *args):
+        '''Push the samples received by the traces since the last flush to
+           the render. If the limits of the axes did not change since the
+           last flush and no sample left the ring buffers, only the new
+           segments are drawn and blitted. Otherwise a draw is requested.
+        '''
+        pending = [trace for trace in self._streams if trace._pending]
+        if not pending:
+            return
+        redraw = not self.is_visible_in_window() or \
+            self._blit_renderer() is None
+        for trace in pending:
+            trace._update_line()
+            redraw = trace._scroll() or trace._needs_redraw() or redraw
+            redraw = redraw or \
+                self._stream_views.get(trace.ax) != self._axes_view(trace.ax)
+        if redraw:
+            self.draw_idle()
+            self.stream_stats['full'] += 1
+        else:
+            renderer = self._blit_renderer()
+            for trace in pending:
+                trace._segment().draw(renderer)
+            for ax in set(trace.ax for trace in pending):
+                self.blit(ax.bbox)
+            self.stream_stats['incremental'] += 1
+        for trace in pending:
+            trace._drawn()
+            self._stream_views[trace.ax] = self._axes_view(trace.ax)
+        self.stream_stats['samples'] = sum(t.samples for t in self._streams)
+        self.stream_stats['samples_per_second'] = sum(
+            t.samples_per_second for t in self._streams)
+
+    def add_producer(self, apply, mode='latest', max_pending=1024,
+                     redraw=True):
+        '''Return a :class:`feeds.StagingBuffer` in which other threads can
+           put data with `put`. Once per frame, on the main thread, the
+           staged items are swapped out and `apply` is called with each of
+           them, e.g. to update the data of an artist; a draw is then
+           requested if `redraw` is True. See :class:`feeds.StagingBuffer`
+           for `mode` and `max_pending`.
+        '''
+        staging = StagingBuffer(mode=mode, max_pending=max_pending)
+        self._producers.append((staging, apply, redraw))
+        if self._producer_event is None:
+            self._producer_event = Clock.schedule_interval(
+                self._consume_producers, 0)
+        return staging
+
+    def attach_feed(self, feed, apply, redraw=True):
+        '''Poll a :class:`feeds.SharedArrayFeed` once per frame and call
+           `apply` with a copy of the published array when its sequence
+           advances. A draw is then requested if `redraw` is
+           True. Detach it with :meth:`remove_producer`.
+        '''
+        self._producers.append((feed, apply, redraw))
+        if self._producer_event is None:
+            self._producer_event = Clock.schedule_interval(
+                self._consume_producers, 0)
+        return feed
+
+    def remove_producer(self, staging):
+        self._producers = [p for p in self._producers if p[0] is not staging]
+        if not self._producers and self._producer_event is not None:
+            Clock.unschedule(self._producer_event)
+            self._producer_event = None
+
+    def _consume_producers(self, *args):
+        redraw = False
+        for staging, apply, needs_redraw in self._producers:
+            items = staging.swap()
+            for item in items:
+                apply(item)
+            staging.stats['applied'] += len(items)
+            redraw = redraw or (needs_redraw and bool(items))
+        if redraw:
+            self.draw_idle()
+
+    def add_tiled_image(self, ax, source, **kwargs):
+        '''Add a :class:`tiled_image.TiledImage` of the (rows, cols[, 3|4])
+           array `source`, e.g. a memmap, to `ax` and fit the limits of the
+           axes to it. The keyword arguments are given to TiledImage. The
+           canvas is redrawn when tiles finish loading in the background.
+        '''
+        image = TiledImage(source, **kwargs)
+
+        def tile_loaded(key):
+            Clock.schedule_once(lambda dt: self._tile_loaded(image), 0)
+        image.on_tile_loaded = tile_loaded
+        ax.add_artist(image)
+        left, right, bottom, top = image.extent
+        ax.set_xlim(left, right)
+        ax.set_ylim(bottom, top)
+        return image
+
+    def _tile_loaded(self, image):
+        image.stale = True
+        self.draw_idle()
+
     def get_mouse_button(self, touch):
         '''Translate kivy convention for left, right and middle click button
            into matplotlib int values: 1 for left, 2 for middle and 3 for
@@ -1199,21 +2223,21 @@ class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
     def _on_mouse_pos(self, *args):
         '''Kivy Event to trigger the following matplotlib events:
            `motion_notify_event`, `leave_notify_event` and
-           `enter_notify_event`.
+           `enter_notify_event`. It is dispatched by the `event_router` only
+           to the canvas under the pointer and to the one it just left.
         '''
-        return
         pos = args[1]
         newcoord = self.to_widget(pos[0], pos[1], relative=True)
         x = newcoord[0]
         y = newcoord[1]
-        inside = self.collide_point(*pos)
+        inside = self.collide_point(*self.to_widget(*pos))
         if inside:
-            self.motion_notify_event(x, y, guiEvent=None)
+            MouseEvent('motion_notify_event', self, x, y)._process()
         if not inside and not self.entered_figure:
-            self.leave_notify_event(guiEvent=None)
+            LocationEvent('figure_leave_event', self, x, y)._process()
             self.entered_figure = True
         elif inside and self.entered_figure:
-            self.enter_notify_event(guiEvent=None, xy=(pos[0], pos[1]))
+            LocationEvent('figure_enter_event', self, x, y)._process()
             self.entered_figure = False
 
     def enter_notify_event(self, guiEvent=None, xy=None):
@@ -1225,46 +2249,247 @@ class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
         self.callbacks.process('figure_leave_event', event)
 
     def _on_pos_changed(self, *args):
-        self.draw()
+        if self._resize_event is None:
+            self.draw_idle()
 
     def _on_size_changed(self, *args):
         '''Changes the size of the matplotlib figure based on the size of the
            widget. The widget will change size according to the parent Layout
-           size.
+           size. Once the canvas has been rendered, consecutive size changes
+           only stretch the last render until the size settles for
+           `resize_settle_delay` seconds.
         '''
+        if not self.resize_settle_delay or self._render_geometry is None:
+            self._apply_size()
+            self.draw_idle()
+            return
+        self._stretch_preview()
+        if self._resize_event is not None:
+            self._resize_event.cancel()
+        self._resize_event = Clock.schedule_once(self._on_resize_settled,
+                                                 self.resize_settle_delay)
+
+    def _apply_size(self):
         w, h = self.size
         dpival = self.figure.dpi
         winch = float(w) / dpival
         hinch = float(h) / dpival
         self.figure.set_size_inches(winch, hinch, forward=False)
         #self.resize_event()
-        self.draw()
+
+    def _on_resize_settled(self, *args):
+        self._resize_event = None
+        self._clear_stretch()
+        self._apply_size()
+        self._resize_render = True
+        self.draw_idle()
+
+    def _stretch_preview(self):
+        '''Scale the graphics instructions of the last render to the current
+           geometry of the widget.
+        '''
+        (x0, y0), (w0, h0) = self._render_geometry
+        if self._stretch is None:
+            translate = Translate(0, 0)
+            scale = Scale(1, 1, 1)
+            before = InstructionGroup()
+            before.add(PushMatrix())
+            before.add(translate)
+            before.add(scale)
+            before.add(Translate(-x0, -y0))
+            after = InstructionGroup()
+            after.add(PopMatrix())
+            self.canvas.before.add(before)
+            self.canvas.after.add(after)
+            self._stretch = (before, after, translate, scale)
+        before, after, translate, scale = self._stretch
+        translate.xy = self.pos
+        scale.x = self.width / float(max(w0, 1))
+        scale.y = self.height / float(max(h0, 1))
+
+    def _clear_stretch(self):
+        if self._stretch is not None:
+            before, after, translate, scale = self._stretch
+            self.canvas.before.remove(before)
+            self.canvas.after.remove(after)
+            self._stretch = None
 
     def callback(self, *largs):
         self.draw()
 
+    def render_to_texture(self):
+        '''Render the graphics instructions of the widget into a
+           :class:`kivy.graphics.Fbo` of the widget size and return the Fbo.
+           Its texture has the origin on the bottom left corner of the widget.
+        '''
+        w, h = int(self.width), int(self.height)
+        fbo = Fbo(size=(max(w, 1), max(h, 1)), with_stencilbuffer=True)
+        with fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            Translate(-self.x, -self.y, 0)
+        # A canvas can only have one parent, it is detached from the parent
+        # widget for the time of the render.
+        parent_canvas = self.parent.canvas if self.parent is not None else None
+        if parent_canvas is not None:
+            index = parent_canvas.indexof(self.canvas)
+            if index > -1:
+                parent_canvas.remove(self.canvas)
+        fbo.add(self.canvas)
+        fbo.draw()
+        fbo.remove(self.canvas)
+        if parent_canvas is not None and index > -1:
+            parent_canvas.insert(index, self.canvas)
+        texture_budget.add(self, 'cache', fbo.texture)
+        return fbo
+
+    def render_offscreen(self, size=None):
+        '''Draw the figure and return the pixels of the render as a (h, w, 4)
+           uint8 RGBA array, top row first. If size is given the widget is
+           resized to it first. The draw is done right away, even if the
+           widget is not shown or is being resized, and the instructions are
+           rendered into an Fbo, so no window needs to be displayed, see
+           :mod:`offscreen`.
+        '''
+        ensure_gl_context()
+        if size is not None:
+            self.size = tuple(int(v) for v in size)
+        if self._resize_event is not None:
+            self._resize_event.cancel()
+            self._resize_event = None
+        self._clear_stretch()
+        self._apply_size()
+        defer = self.defer_offscreen_draws
+        self.defer_offscreen_draws = False
+        try:
+            self.draw()
+        finally:
+            self.defer_offscreen_draws = defer
+        return read_pixels(self.render_to_texture())
+
+    def save_offscreen(self, filename, size=None):
+        '''Write the render of :meth:`render_offscreen` to filename, a path
+           or a file-like object, as PNG.
+        '''
+        write_png(filename, self.render_offscreen(size))
+
+    def savefig_async(self, filename, on_progress=None, executor=None,
+                      **kwargs):
+        '''Save the figure to filename without blocking the UI: the figure is
+           pickled and rendered with agg in a worker process, or in executor
+           if given. Return an :class:`export.ExportJob` whose `future` is
+           the render and which can be cancelled. on_progress is called on
+           the main thread with the job and each of its new states. The
+           keyword arguments are given to `savefig`. A figure that cannot be
+           pickled is drawn on the main thread on the next frame, only the
+           encoding runs in the background.
+        '''
+        from export import export_async
+        progress = None
+        if on_progress is not None:
+            def progress(job, state):
+                Clock.schedule_once(lambda dt: on_progress(job, state))
+
+        def schedule(render):
+            Clock.schedule_once(lambda dt: render())
+        return export_async(self.figure, filename, executor=executor,
+                            progress=progress, schedule=schedule, **kwargs)
+
+    def copy_from_bbox(self, bbox):
+        '''Return a region of the current render delimited by bbox, given in
+           matplotlib coordinates. The region holds a cached texture that can
+           be put back with :meth:`restore_region`.
+        '''
+        fbo = self.render_to_texture()
+        x0, y0, x1, y1 = _bbox_to_pixels(bbox, fbo.size)
+        texture = fbo.texture.get_region(x0, y0, x1 - x0, y1 - y0)
+        return RegionKivy(fbo, texture, (x0, y0, x1, y1), tuple(self.size))
+
+    def restore_region(self, region, bbox=None, xy=None):
+        '''Put back a region saved with :meth:`copy_from_bbox`. The first
+           restore after a draw or a blit drops the graphics instructions of
+           the previous frame so the animated artists can be drawn on top of
+           the cached background with `draw_artist`.
+        '''
+        if region.widget_size != tuple(self.size):
+            return
+        if not self._restoring:
+            self.clear_widgets()
+            self.canvas.clear()
+            renderer = self._renderer
+            if renderer is not None:
+                renderer.clip_rectangles = []
+                renderer._markers = {}
+            if self.line_engine is not None:
+                self.line_engine.begin()
+            texture_budget.reset(self, ('image', 'text'))
+            self._restoring = True
+            self._blitted = True
+        x0, y0, x1, y1 = region.extents
+        texture = region.texture
+        if bbox is not None or xy is not None:
+            sx0, sy0, sx1, sy1 = (_bbox_to_pixels(bbox, self.size)
+                                  if bbox is not None else region.extents)
+            dx, dy = xy if xy is not None else (sx0, sy0)
+            texture = region.fbo.texture.get_region(sx0, sy0, sx1 - sx0,
+                                                    sy1 - sy0)
+            x0, y0 = int(dx), int(dy)
+            x1, y1 = x0 + sx1 - sx0, y0 + sy1 - sy0
+        with self.canvas:
+            Color(1.0, 1.0, 1.0, 1.0)
+            Rectangle(texture=texture, pos=(self.x + x0, self.y + y0),
+                      size=(x1 - x0, y1 - y0))
+
     def blit(self, bbox=None):
-        '''If bbox is None, blit the entire canvas to the widget. Otherwise
-           blit only the area defined by the bbox.
+        '''Present the graphics instructions added since the last
+           :meth:`restore_region` on the next frame. The whole widget is
+           updated whatever bbox is given.
         '''
-        self.blitbox = bbox
+        self._restoring = False
+        if self.line_engine is not None:
+            self.line_engine.flush()
+        self.canvas.ask_update()
 
     filetypes = FigureCanvasBase.filetypes.copy()
-    filetypes['png'] = 'Portable Network Graphics'
-
-    def print_png(self, filename, *args, **kwargs):
-        '''Call the widget function to make a png of the widget.
+    filetypes.update({'png': 'Portable Network Graphics',
+                      'raw': 'Raw RGBA bitmap',
+                      'rgba': 'Raw RGBA bitmap',
+                      'jpg': 'Joint Photographic Experts Group',
+                      'jpeg': 'Joint Photographic Experts Group',
+                      'tif': 'Tagged Image File Format',
+                      'tiff': 'Tagged Image File Format'})
+
+    def _print_raster(self, fmt, filename_or_obj, *args, **kwargs):
+        '''Render the figure with agg, without touching the widget, and
+           write it to filename_or_obj, a path or a file-like object, in fmt.
+           See :func:`export.write_image`.
         '''
-        fig = FigureCanvasAgg(self.figure)
-        FigureCanvasAgg.draw(fig)
+        from export import render_rgba, write_image
+        write_image(filename_or_obj, render_rgba(self.figure), fmt,
+                    dpi=self.figure.dpi, metadata=kwargs.get('metadata'),
+                    pil_kwargs=kwargs.get('pil_kwargs'))
+
+    def print_png(self, filename_or_obj, *args, **kwargs):
+        '''Write the figure as PNG to filename_or_obj, a path or a file-like
+           object.
+        '''
+        self._print_raster('png', filename_or_obj, *args, **kwargs)
 
-        l, b, w, h = self.figure.bbox.bounds
-        texture = Texture.create(size=(w, h))
-        texture.blit_buffer(bytes(fig.get_renderer().buffer_rgba()),
-                                colorfmt='rgba', bufferfmt='ubyte')
-        texture.flip_vertical()
-        img = Image(texture)
-        img.save(filename)
+    def print_raw(self, filename_or_obj, *args, **kwargs):
+        '''Write the RGBA pixels of the figure, top row first.'''
+        self._print_raster('raw', filename_or_obj, *args, **kwargs)
+
+    print_rgba = print_raw
+
+    def print_jpg(self, filename_or_obj, *args, **kwargs):
+        self._print_raster('jpeg', filename_or_obj, *args, **kwargs)
+
+    print_jpeg = print_jpg
+
+    def print_tif(self, filename_or_obj, *args, **kwargs):
+        self._print_raster('tiff', filename_or_obj, *args, **kwargs)
+
+    print_tiff = print_tif
 
     def get_default_filetype(self):
         return 'png'
@@ -1280,7 +2505,12 @@ class FigureCanvasKivy(FocusBehavior, Widget, FigureCanvasBase):
         *callbacks*
           Sequence of (func, args, kwargs) where func(*args, **kwargs) will
           be executed by the timer every *interval*.
+        *frame_sync*
+          Run the timer on the frame boundary and skip missed intervals.
+          Defaults to the `timer_frame_sync` attribute of the canvas, which
+          allows enabling it for the timers created by FuncAnimation.
         """
+        kwargs.setdefault('frame_sync', self.timer_frame_sync)
         return TimerKivy(*args, **kwargs)
 
 
@@ -1298,14 +2528,14 @@ class FigureManagerKivy(FigureManagerBase):
         pass
 
     def get_window_title(self):
-        return Window.title
+        return _window().title
 
     def set_window_title(self, title):
-        Window.title = title
+        _window().title = title
 
     def resize(self, w, h):
         if (w > 0) and (h > 0):
-            Window.size = w, h
+            _window().size = w, h
 
     def _get_toolbar(self):
         if rcParams['toolbar'] == 'toolbar2':
@@ -46,10 +46,13 @@ If a change is done on the figure an update can be performed using
 
 The plot can be exported to png with
 :meth:`~kivy.ext.mpl.backend_kivyagg.FigureCanvasKivyAgg.print_png`, as an
-argument receives the `filename`.::
+argument receives the `filename` or a file-like object. `print_jpg`,
+`print_tif` and `print_raw` write the other formats.::
 
     # export to png
     canvas.print_png("my_plot.png")
+    buf = io.BytesIO()
+    canvas.print_png(buf)
 
 
 Backend KivyAgg Events
@@ -69,14 +72,10 @@ from __future__ import (absolute_import, division, print_function,
 
 __all__ = ('FigureCanvasKivyAgg')
 
-import six
 
-import matplotlib
-from matplotlib._pylab_helpers import Gcf
-from matplotlib.backend_bases import RendererBase, GraphicsContextBase,\
-    FigureManagerBase, FigureCanvasBase
+import numpy as np
+from timeit import default_timer
 from matplotlib.figure import Figure
-from matplotlib.transforms import Bbox
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backend_bases import register_backend, ShowBase
 
@@ -87,15 +86,13 @@ except ImportError:
 
 from kivy.app import App
 from kivy.graphics.texture import Texture
-from kivy.graphics import Rectangle, Color
-from kivy.uix.widget import Widget
-from kivy.properties import ObjectProperty
-from kivy.base import EventLoop
-from kivy.uix.floatlayout import FloatLayout
-from kivy.core.image import Image
+from kivy.graphics import Rectangle, Color, RenderContext
 from backend_kivy import FigureCanvasKivy,\
                             FigureManagerKivy, show, new_figure_manager,\
-                            NavigationToolbar2Kivy
+                            NavigationToolbar2Kivy, MPLKivyApp,\
+                            _bbox_to_pixels, texture_budget
+from texture_formats import TEXTURE_FORMATS, RGB565_SHADER, upload_format,\
+                            convert
 
 register_backend('png', 'backend_kivyagg', 'PNG File Format')
 
@@ -129,25 +126,6 @@ def new_figure_manager_given_figure(num, figure):
     return manager
 
 
-class MPLKivyApp(App):
-    '''Creates the App initializing a FloatLayout with a figure and toolbar
-       widget.
-    '''
-    figure = ObjectProperty(None)
-    toolbar = ObjectProperty(None)
-
-    def build(self):
-        EventLoop.ensure_window()
-        layout = FloatLayout()
-        if self.figure:
-            self.figure.size_hint_y = 0.9
-            layout.add_widget(self.figure)
-        if self.toolbar:
-            self.toolbar.size_hint_y = 0.1
-            layout.add_widget(self.toolbar)
-        return layout
-
-
 class Show(ShowBase):
     '''mainloop needs to be overwritten to define the show() behavior for kivy
        framework.
@@ -163,48 +141,196 @@ class Show(ShowBase):
 show = Show()
 
 
+def _set_dpi(figure, dpi):
+    '''Change the dpi of figure without resizing the canvas.'''
+    try:
+        figure._set_dpi(dpi, forward=False)
+    except TypeError:
+        figure._set_dpi(dpi)
+
+
 class FigureCanvasKivyAgg(FigureCanvasKivy, FigureCanvasAgg):
     '''FigureCanvasKivyAgg class. See module documentation for more
     information.
     '''
 
+    # When not 0 the texture sizes are rounded up to multiples of
+    # `resize_bucket` pixels so that the texture is reused by renders of
+    # slightly different sizes, only the rendered part being displayed.
+    resize_bucket = 0
+
+    # Pixel format of the texture the render is uploaded to, 'rgba', 'rgb'
+    # or 'rgb565', see :mod:`texture_formats`. The reduced formats are only
+    # used for opaque figures. The bytes uploaded are counted in
+    # `draw_stats['uploaded_bytes']`.
+    texture_format = 'rgba'
+
     def __init__(self, figure, **kwargs):
         self.figure = figure
         self.bind(size=self._on_size_changed)
-        super(FigureCanvasKivyAgg, self).__init__(figure=self.figure, **kwargs)
         self.img_texture = None
         self.img_rect = None
-        self.blit()
+        self.bg_rect = None
+        self._img_format = None
+        super(FigureCanvasKivyAgg, self).__init__(figure=self.figure, **kwargs)
+        self.draw_stats['uploaded_bytes'] = 0
 
-    def draw(self):
+    def draw(self, force=False):
         '''
-        Draw the figure using the agg renderer
+        Draw the figure using the agg renderer. The draw is skipped if the
+        last render is up to date, unless force is True.
+        '''
+        if not force and self._up_to_date():
+            self.draw_stats['skipped'] += 1
+            return
+        if self._defer_draw():
+            return
+        start = default_timer()
+        scale = self.quality.current['dpi_scale']
+        dpi = self.figure.dpi
+        self._drawing = True
+        try:
+            if scale != 1.0:
+                _set_dpi(self.figure, dpi * scale)
+            with self.quality.apply(self.get_renderer()):
+                FigureCanvasAgg.draw(self)
+            self._update_texture(scale)
+        finally:
+            self._drawing = False
+            if scale != 1.0:
+                _set_dpi(self.figure, dpi)
+                # Only the dpi of the render changed.
+                self.figure.stale = False
+        self._rendered(default_timer() - start)
+
+    def _current_render_key(self):
+        # The texture follows the widget position without a render.
+        return (tuple(int(v) for v in self.figure.bbox.size),
+                self.figure.dpi, self.quality.tier,
+                upload_format(self.texture_format, self.figure))
+
+    def _up_to_date(self):
+        return self.img_texture is not None and \
+            super(FigureCanvasKivyAgg, self)._up_to_date()
+
+    def _texture_size(self, w, h):
+        '''Size of the texture holding a render of w x h pixels.'''
+        bucket = self.resize_bucket
+        if not bucket:
+            return (w, h)
+        return (-(-w // bucket) * bucket, -(-h // bucket) * bucket)
+
+    def _update_texture(self, scale=1.0):
+        '''Upload the agg buffer to the texture displayed by the widget. The
+           texture is reused as long as the size of the render does not
+           change. A render done at `scale` times the dpi of the figure is
+           stretched over the widget.
         '''
         self.canvas.clear()
-        FigureCanvasAgg.draw(self)
-        if self.blitbox is None:
-            l, b, w, h = self.figure.bbox.bounds
-            w, h = int(w), int(h)
-            buf_rgba = self.get_renderer().buffer_rgba()
-        else:
-            bbox = self.blitbox
-            l, b, r, t = bbox.extents
-            w = int(r) - int(l)
-            h = int(t) - int(b)
-            t = int(b) + h
-            reg = self.copy_from_bbox(bbox)
-            buf_rgba = reg.to_string()
-        texture = Texture.create(size=(w, h))
-        texture.flip_vertical()
+        renderer = self.get_renderer()
+        w, h = int(renderer.width), int(renderer.height)
+        fmt = upload_format(self.texture_format, self.figure)
+        texture = self.img_texture
+        tw, th = self._texture_size(w, h)
+        if texture is None or tuple(texture.size) != (tw, th) or \
+                fmt != self._img_format:
+            texture = Texture.create(size=(tw, th),
+                                     colorfmt=TEXTURE_FORMATS[fmt][0])
+            texture.flip_vertical()
+            if fmt == 'rgb565':
+                # Packed pixels must not be interpolated.
+                texture.mag_filter = 'nearest'
+                texture.min_filter = 'nearest'
         color = self.figure.get_facecolor()
+        size = (w, h) if scale == 1.0 else tuple(self.size)
         with self.canvas:
             Color(*color)
-            Rectangle(pos=self.pos, size=(w, h))
+            self.bg_rect = Rectangle(pos=self.pos, size=size)
+        target = self.canvas
+        if fmt == 'rgb565':
+            target = RenderContext(use_parent_projection=True,
+                                   use_parent_modelview=True)
+            target.shader.fs = RGB565_SHADER
+            self.canvas.add(target)
+        with target:
             Color(1.0, 1.0, 1.0, 1.0)
             self.img_rect = Rectangle(texture=texture, pos=self.pos,
-                                      size=(w, h))
-        texture.blit_buffer(bytes(buf_rgba), colorfmt='rgba', bufferfmt='ubyte')
+                                      size=size)
+        # Rows are stored top down like the agg buffer, the rendered part is
+        # displayed flipped.
+        u, v = w / float(tw), h / float(th)
+        self.img_rect.tex_coords = (0, v, u, v, u, 0, 0, 0)
         self.img_texture = texture
+        self._img_format = fmt
+        self._upload(self._agg_pixels(renderer), (0, 0))
+        texture_budget.set(self, 'figure', texture)
+
+    def _agg_pixels(self, renderer):
+        w, h = int(renderer.width), int(renderer.height)
+        return np.frombuffer(renderer.buffer_rgba(), np.uint8).reshape(h, w, 4)
+
+    def _upload(self, pixels, pos):
+        '''Convert the (h, w, 4) pixels to the format of the texture and
+           upload them at pos.
+        '''
+        fmt = self._img_format
+        data = convert(pixels, fmt)
+        self.img_texture.blit_buffer(data, pos=pos,
+                                     size=(pixels.shape[1], pixels.shape[0]),
+                                     colorfmt=TEXTURE_FORMATS[fmt][0],
+                                     bufferfmt='ubyte')
+        self.draw_stats['uploaded_bytes'] += len(data)
+
+    def evict_textures(self):
+        super(FigureCanvasKivyAgg, self).evict_textures()
+        self.img_texture = None
+        self.img_rect = None
+        self.bg_rect = None
+        self._img_format = None
+
+    # The agg canvas keeps its own pixel buffer, its blitting methods are
+    # used instead of the ones of the kivy vector canvas.
+    get_renderer = FigureCanvasAgg.get_renderer
+    copy_from_bbox = FigureCanvasAgg.copy_from_bbox
+
+    def restore_region(self, region, bbox=None, xy=None):
+        # The buffer no longer holds the render of the figure.
+        self._blitted = True
+        FigureCanvasAgg.restore_region(self, region, bbox, xy)
+
+    def _blit_renderer(self):
+        if self.img_texture is None:
+            return None
+        return self.get_renderer()
+
+    def blit(self, bbox=None):
+        '''Upload the area of the agg buffer defined by bbox to the displayed
+           texture and present it on the next frame. If bbox is None the
+           whole buffer is uploaded. Blits issued while the figure is being
+           drawn, e.g. from a `draw_event` callback, are included in the
+           upload done at the end of the draw.
+        '''
+        if self._drawing:
+            return
+        renderer = self.get_renderer()
+        w, h = int(renderer.width), int(renderer.height)
+        texture = self.img_texture
+        if texture is None or tuple(texture.size) != self._texture_size(w, h) \
+                or upload_format(self.texture_format, self.figure) != \
+                self._img_format:
+            self.draw(force=True)
+            return
+        pixels = self._agg_pixels(renderer)
+        if bbox is None:
+            self._upload(pixels, (0, 0))
+        else:
+            x0, y0, x1, y1 = _bbox_to_pixels(bbox, (w, h))
+            if x1 <= x0 or y1 <= y0:
+                return
+            # Rows of the texture are stored top down like the agg buffer,
+            # the texture is only flipped when displayed.
+            self._upload(pixels[h - y1:h - y0, x0:x1], (x0, h - y1))
+        self.canvas.ask_update()
 
     filetypes = FigureCanvasKivy.filetypes.copy()
     filetypes['png'] = 'Portable Network Graphics'
@@ -212,21 +338,13 @@ class FigureCanvasKivyAgg(FigureCanvasKivy, FigureCanvasAgg):
     def _on_pos_changed(self, *args):
         if self.img_rect is not None:
             self.img_rect.pos = self.pos
+            self.bg_rect.pos = self.pos
 
-    def _print_image(self, filename, *args, **kwargs):
-        '''Write out format png. The image is saved with the filename given.
-        '''
-        l, b, w, h = self.figure.bbox.bounds
-        img = None
-        if self.img_texture is None:
-            texture = Texture.create(size=(w, h))
-            texture.blit_buffer(bytes(self.get_renderer().buffer_rgba()),
-                                colorfmt='rgba', bufferfmt='ubyte')
-            texture.flip_vertical()
-            img = Image(texture)
-        else:
-            img = Image(self.img_texture)
-        img.save(filename)
+    def _stretch_preview(self):
+        '''Stretch the texture of the last render over the widget.'''
+        if self.img_rect is not None:
+            self.bg_rect.size = self.size
+            self.img_rect.size = self.size
 
 ''' Standard names that backend.__init__ is expecting '''
 FigureCanvas = FigureCanvasKivyAgg
@@ -0,0 +1,189 @@
+'''
+Backend KivyHybrid
+=====
+
+The :class:`FigureCanvasKivyHybrid` widget combines both backends. The static
+part of the figure, i.e. every artist not flagged as animated (axes, grids,
+tick labels, dense background data), is rasterized by agg into a texture like
+:class:`~backend_kivyagg.FigureCanvasKivyAgg` does. The animated artists are
+drawn on top of it as kivy graphics instructions, like
+:class:`~backend_kivy.FigureCanvasKivy` does, on an overlay widget.
+
+The texture is rendered again only when the figure is stale or the widget is
+resized. Changing an animated artist does not make the figure stale, so a
+draw after such a change only rebuilds the instructions of the animated
+artists.
+
+Examples
+--------
+
+A line moving over a dense scatter plot::
+
+    fig, ax = plt.subplots()
+    ax.scatter(*np.random.normal(size=(2, 100000)), s=1)
+    line, = ax.plot(x, np.sin(x), animated=True)
+    canvas = FigureCanvasKivyHybrid(fig)
+
+    def update(dt):
+        line.set_ydata(np.sin(x + Clock.get_time()))
+        canvas.draw_idle()
+
+    Clock.schedule_interval(update, 0)
+
+The number of renders of the static texture and of the overlay are counted
+in `draw_stats['rendered']` and `draw_stats['overlay']`. The `draw_event` of
+matplotlib is only fired by the renders of the static texture.
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+__all__ = ('FigureCanvasKivyHybrid')
+
+from matplotlib.figure import Figure
+from matplotlib.backend_bases import ShowBase
+
+try:
+    import kivy
+except ImportError:
+    raise ImportError("this backend requires Kivy to be installed.")
+
+from kivy.app import App
+from kivy.uix.widget import Widget
+from backend_kivy import FigureManagerKivy, NavigationToolbar2Kivy,\
+                            RendererKivy, MPLKivyApp, texture_budget
+from backend_kivyagg import FigureCanvasKivyAgg
+
+toolbar = None
+my_canvas = None
+
+
+def new_figure_manager(num, *args, **kwargs):
+    '''Create a new figure manager instance for the figure given.
+    '''
+    FigureClass = kwargs.pop('FigureClass', Figure)
+    thisFig = FigureClass(*args, **kwargs)
+    return new_figure_manager_given_figure(num, thisFig)
+
+
+def new_figure_manager_given_figure(num, figure):
+    '''Create a new figure manager instance and a new figure canvas instance
+       for the given figure.
+    '''
+    canvas = FigureCanvasKivyHybrid(figure)
+    manager = FigureManagerKivy(canvas, num)
+    global my_canvas
+    global toolbar
+    toolbar = manager.toolbar.actionbar if manager.toolbar else None
+    my_canvas = canvas
+    return manager
+
+
+class Show(ShowBase):
+    '''mainloop needs to be overwritten to define the show() behavior for kivy
+       framework.
+    '''
+    def mainloop(self):
+        app = App.get_running_app()
+        if app is None:
+            app = MPLKivyApp(figure=my_canvas, toolbar=toolbar)
+            app.run()
+
+show = Show()
+
+
+class HybridOverlay(Widget):
+    '''Widget on which the animated artists are drawn by a RendererKivy. It
+       covers the canvas and shares its figure and line engine.
+    '''
+
+    def __init__(self, canvas, **kwargs):
+        super(HybridOverlay, self).__init__(**kwargs)
+        self.figure_canvas = canvas
+        self.figure = canvas.figure
+
+    @property
+    def line_engine(self):
+        return self.figure_canvas.line_engine
+
+
+class FigureCanvasKivyHybrid(FigureCanvasKivyAgg):
+    '''FigureCanvasKivyHybrid class. See module documentation for more
+    information.
+    '''
+
+    def __init__(self, figure, **kwargs):
+        self.overlay = None
+        self._static_size = None
+        super(FigureCanvasKivyHybrid, self).__init__(figure, **kwargs)
+        self.draw_stats['overlay'] = 0
+        self.overlay = HybridOverlay(self, pos=self.pos, size=self.size)
+
+    def draw(self, force=False):
+        '''Render the static artists with agg if the figure is stale, the
+           widget was resized or force is True, then draw the animated
+           artists on top. The animated artists do not make the figure
+           stale, so they are always drawn again.
+        '''
+        if self._defer_draw():
+            return
+        size = tuple(int(v) for v in self.figure.bbox.size)
+        if force or not self._up_to_date() or size != self._static_size:
+            super(FigureCanvasKivyHybrid, self).draw(force=True)
+            self._static_size = size
+        self.draw_overlay()
+
+    def animated_artists(self):
+        '''Return the visible animated artists of the figure in drawing
+           order.
+        '''
+        artists = self.figure.findobj(
+            lambda artist: artist.get_animated() and artist.get_visible(),
+            include_self=False)
+        return sorted(artists, key=lambda artist: artist.get_zorder())
+
+    def draw_overlay(self):
+        '''Rebuild the instructions of the animated artists.'''
+        overlay = self.overlay
+        if overlay is None:
+            return
+        # Clearing the canvas for a new texture removes the overlay too.
+        if overlay.parent is not self:
+            if overlay.parent is not None:
+                overlay.parent.remove_widget(overlay)
+            self.add_widget(overlay)
+        elif overlay.canvas not in self.canvas.children:
+            self.remove_widget(overlay)
+            self.add_widget(overlay)
+        overlay.pos = self.pos
+        overlay.size = self.size
+        overlay.clear_widgets()
+        overlay.canvas.clear()
+        texture_budget.reset(self, ('image', 'text'))
+        engine = self.line_engine
+        if engine is not None:
+            engine.begin()
+        renderer = RendererKivy(overlay)
+        for artist in self.animated_artists():
+            artist.draw(renderer)
+        if engine is not None:
+            engine.flush()
+        self.draw_stats['overlay'] += 1
+        texture_budget.drawn(self)
+
+    def _stretch_preview(self):
+        # The animated artists are drawn again once the size settled.
+        super(FigureCanvasKivyHybrid, self)._stretch_preview()
+        if self.overlay is not None:
+            self.overlay.canvas.clear()
+
+    def _on_pos_changed(self, *args):
+        super(FigureCanvasKivyHybrid, self)._on_pos_changed(*args)
+        if self.img_texture is not None:
+            self.draw_overlay()
+
+''' Standard names that backend.__init__ is expecting '''
+FigureCanvas = FigureCanvasKivyHybrid
+FigureManager = FigureManagerKivy
+NavigationToolbar = NavigationToolbar2Kivy
+show = show
@@ -0,0 +1,75 @@
+'''Frames per second of an animated line over a heavy static background.
+
+Run with the canvas and the animation mode to compare::
+
+    python bench_blit.py agg blit
+    python bench_blit.py agg noblit
+    python bench_blit.py kivy blit
+    python bench_blit.py kivy noblit
+
+The fps is printed every second and the average when the window is closed.
+'''
+import sys
+import time
+
+import numpy as np
+import matplotlib
+matplotlib.use('module://kivy.garden.matplotlib.backend_kivy')
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+from kivy.app import App
+from kivy.clock import Clock
+
+from kivy.garden.matplotlib.backend_kivy import FigureCanvasKivy
+from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg
+
+canvas_kind = sys.argv[1] if len(sys.argv) > 1 else 'agg'
+blit = (sys.argv[2] if len(sys.argv) > 2 else 'blit') == 'blit'
+n_background = 20000
+
+fig, ax = plt.subplots()
+rng = np.random.RandomState(0)
+ax.scatter(rng.rand(n_background) * 2 * np.pi, rng.randn(n_background),
+           s=2, alpha=0.3)
+ax.grid(True)
+x = np.linspace(0, 2 * np.pi, 400)
+line, = ax.plot(x, np.sin(x), lw=2, color='r', animated=blit)
+ax.set_xlim(0, 2 * np.pi)
+ax.set_ylim(-3, 3)
+
+frames = [0]
+
+
+def update(i):
+    line.set_ydata(np.sin(x + i / 10.0))
+    frames[0] += 1
+    return line,
+
+
+class BenchApp(App):
+
+    def build(self):
+        if canvas_kind == 'agg':
+            canvas = FigureCanvasKivyAgg(fig)
+        else:
+            canvas = FigureCanvasKivy(fig)
+        canvas.timer_frame_sync = True
+        self.anim = FuncAnimation(fig, update, interval=1, blit=blit)
+        self.start = time.time()
+        self.last = (self.start, 0)
+        Clock.schedule_interval(self.report, 1.0)
+        return canvas
+
+    def report(self, dt):
+        now = time.time()
+        t, n = self.last
+        print('%s %s: %.1f fps' % (canvas_kind, 'blit' if blit else 'noblit',
+                                   (frames[0] - n) / (now - t)))
+        self.last = (now, frames[0])
+
+    def on_stop(self):
+        print('average: %.1f fps' % (frames[0] / (time.time() - self.start)))
+
+
+if __name__ == '__main__':
+    BenchApp().run()
@@ -0,0 +1,58 @@
+'''Cold import time of the backends.
+
+Each backend is imported in a fresh interpreter, `repeat` times, and the best
+time is printed with the deferred modules that were imported anyway::
+
+    python bench_import.py
+    python bench_import.py kivy.garden.matplotlib.backend_kivyagg 10
+
+Importing a backend must not open the window nor load the toolbar, dialog,
+export and multiprocessing modules, they are imported on first use.
+`kivy.lang` and `matplotlib.mathtext` are always loaded, by `kivy.base` and
+by `matplotlib.backend_bases`, and `concurrent.futures` by the asyncio
+support of `kivy.clock`.
+'''
+import subprocess
+import sys
+
+modules = [sys.argv[1]] if len(sys.argv) > 1 else [
+    'kivy.garden.matplotlib.backend_kivy',
+    'kivy.garden.matplotlib.backend_kivyagg',
+    'kivy.garden.matplotlib.backend_kivyhybrid']
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+deferred = ('kivy.core.window', 'kivy.uix.actionbar', 'kivy.uix.popup',
+            'kivy.uix.textinput', 'kivy.uix.filechooser', 'export',
+            'multiprocessing')
+
+script = '''
+import sys
+import time
+import matplotlib
+start = time.time()
+import %s
+elapsed = time.time() - start
+print(' '.join([repr(elapsed)] +
+               [name for name in %r if name in sys.modules]))
+'''
+
+
+def measure(module):
+    times = []
+    loaded = ''
+    for i in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', script % (module, deferred)],
+            universal_newlines=True)
+        fields = output.strip().splitlines()[-1].split()
+        times.append(float(fields[0]))
+        loaded = ' '.join(fields[1:])
+    return min(times), loaded
+
+
+if __name__ == '__main__':
+    for module in modules:
+        best, loaded = measure(module)
+        print('%s: %.1f ms' % (module, best * 1000))
+        if loaded:
+            print('    imported at import time: %s' % loaded)
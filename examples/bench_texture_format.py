@@ -0,0 +1,92 @@
+'''Bytes uploaded and frame time of the texture formats of the agg canvas.
+
+Run with a texture format to animate a figure on a FigureCanvasKivyAgg::
+
+    python bench_texture_format.py rgba
+    python bench_texture_format.py rgb
+    python bench_texture_format.py rgb565
+
+The fps, the average render time and the bytes uploaded per frame are
+printed every second. Without kivy, the cost of the conversions alone is
+measured on an agg render of the same figure::
+
+    python bench_texture_format.py convert
+'''
+import sys
+import time
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+mode = sys.argv[1] if len(sys.argv) > 1 else 'rgba'
+
+fig, ax = plt.subplots(figsize=(8, 6), dpi=100)
+rng = np.random.RandomState(0)
+ax.scatter(rng.rand(5000) * 2 * np.pi, rng.randn(5000), s=2, alpha=0.3)
+ax.grid(True)
+x = np.linspace(0, 2 * np.pi, 400)
+line, = ax.plot(x, np.sin(x), lw=2, color='r')
+ax.set_xlim(0, 2 * np.pi)
+ax.set_ylim(-3, 3)
+
+
+def bench_convert(repeat=50):
+    from texture_formats import TEXTURE_FORMATS, convert
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())
+    print('render of %d x %d pixels' % (pixels.shape[1], pixels.shape[0]))
+    for fmt in ('rgba', 'rgb', 'rgb565'):
+        start = time.time()
+        for i in range(repeat):
+            data = convert(pixels, fmt)
+        elapsed = (time.time() - start) / repeat
+        print('%-7s %8d bytes (%d per pixel), conversion %.2f ms' % (
+            fmt, len(data), TEXTURE_FORMATS[fmt][1], elapsed * 1000))
+
+
+def bench_canvas(texture_format):
+    from kivy.app import App
+    from kivy.clock import Clock
+    from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg
+
+    class BenchApp(App):
+
+        def build(self):
+            self.canvas = FigureCanvasKivyAgg(fig)
+            self.canvas.texture_format = texture_format
+            self.frames = 0
+            self.render_time = 0.0
+            self.last = (time.time(), 0, 0)
+            Clock.schedule_interval(self.update, 0)
+            Clock.schedule_interval(self.report, 1.0)
+            return self.canvas
+
+        def update(self, dt):
+            line.set_ydata(np.sin(x + self.frames / 10.0))
+            start = time.time()
+            self.canvas.draw()
+            self.render_time += time.time() - start
+            self.frames += 1
+
+        def report(self, dt):
+            now = time.time()
+            t, n, uploaded = self.last
+            frames = max(self.frames - n, 1)
+            stats = self.canvas.draw_stats
+            print('%s: %.1f fps, %.2f ms per render, %d bytes per frame' % (
+                texture_format, (self.frames - n) / (now - t),
+                self.render_time / frames * 1000,
+                (stats['uploaded_bytes'] - uploaded) // frames))
+            self.render_time = 0.0
+            self.last = (now, self.frames, stats['uploaded_bytes'])
+
+    BenchApp().run()
+
+
+if __name__ == '__main__':
+    if mode == 'convert':
+        bench_convert()
+    else:
+        bench_canvas(mode)
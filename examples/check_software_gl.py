@@ -0,0 +1,261 @@
+'''Render the canvases on a software OpenGL and check the pixels.
+
+Runs without a display, with the SDL offscreen video driver and Mesa
+(llvmpipe) or under `xvfb-run`::
+
+    python check_software_gl.py
+
+Each check prints `ok` or the reason it failed, the exit status is the number
+of failed checks.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+os.environ.setdefault('KIVY_LOG_LEVEL', 'warning')
+
+import offscreen
+offscreen.setup_headless()
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from backend_kivy import FigureCanvasKivy
+
+size = (320, 240)
+
+
+def red_pixels(pixels):
+    r, g, b, a = (pixels[..., i].astype(int) for i in range(4))
+    return int(np.count_nonzero((r > 200) & (g < 80) & (b < 80) & (a > 200)))
+
+
+def line_figure(**kwargs):
+    fig = plt.figure(facecolor='white')
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.plot([0.1, 0.9], [0.5, 0.5], color='red', lw=6, **kwargs)
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    return fig
+
+
+def check_batch_lines():
+    '''Strokes drawn by the shaders of the line engine cover the area of
+       the line.
+    '''
+    fig = line_figure()
+    canvas = FigureCanvasKivy(fig)
+    canvas.batch_lines = True
+    drawn = red_pixels(canvas.render_offscreen(size))
+    if not canvas.line_engine.stats['segments']:
+        return 'the line engine was not used'
+    expected = 0.8 * size[0] * 6 * fig.dpi / 72.0
+    if abs(drawn - expected) > 0.15 * expected:
+        return 'line engine drew %d pixels, expected %d' % (drawn, expected)
+
+
+def check_blit():
+    '''An animated artist drawn with `draw_artist` over a background cached
+       in a `draw_event` callback, with the static strokes batched.
+    '''
+    fig = line_figure()
+    ax = fig.axes[0]
+    moving, = ax.plot([0.5, 0.5], [0.1, 0.9], color='blue', lw=6,
+                      animated=True)
+    canvas = FigureCanvasKivy(fig)
+    canvas.batch_lines = True
+    backgrounds = []
+    fig.canvas.mpl_connect('draw_event', lambda event: backgrounds.append(
+        canvas.copy_from_bbox(ax.bbox)))
+    canvas.render_offscreen(size)
+    if not backgrounds:
+        return 'no draw_event'
+    canvas.restore_region(backgrounds[-1])
+    ax.draw_artist(moving)
+    canvas.blit(ax.bbox)
+    pixels = offscreen.read_pixels(canvas.render_to_texture())
+    if red_pixels(pixels) < 0.5 * 0.8 * size[0] * 6 * fig.dpi / 72.0:
+        return 'the cached background misses the batched strokes'
+    r, g, b = (pixels[..., i].astype(int) for i in range(3))
+    if not np.count_nonzero((b > 200) & (r < 80) & (g < 80)):
+        return 'the animated artist was not drawn'
+
+
+def check_hover():
+    '''Pointer moves dispatched by the event router fire the matplotlib
+       enter, motion and leave events.
+    '''
+    from kivy.uix.floatlayout import FloatLayout
+    from backend_kivy import event_router
+    window = offscreen.ensure_gl_context()
+    canvas = FigureCanvasKivy(line_figure(), size_hint=(None, None),
+                              pos=(0, 0), size=(100, 100))
+    layout = FloatLayout(size=window.size)
+    layout.add_widget(canvas)
+    window.add_widget(layout)
+    events = []
+    for name in ('figure_enter_event', 'motion_notify_event',
+                 'figure_leave_event'):
+        canvas.mpl_connect(name, lambda event: events.append(event.name))
+    try:
+        for pos in ((50, 50), (60, 60), (300, 300)):
+            event_router._on_mouse_pos(window, pos)
+    finally:
+        window.remove_widget(layout)
+    expected = ['motion_notify_event', 'figure_enter_event',
+                'motion_notify_event', 'figure_leave_event']
+    if events != expected:
+        return 'events %s, expected %s' % (events, expected)
+
+
+def check_savefig_async():
+    '''A figure that cannot be pickled, here because of the picker of a
+       spatial index, is still saved. It is drawn on the main thread, on the
+       next frame, without draw_event nor clearing the stale flag.
+    '''
+    import tempfile
+    import threading
+    from kivy.clock import Clock
+    fig = line_figure()
+    canvas = FigureCanvasKivy(fig)
+    canvas.enable_spatial_index(fig.axes[0].lines[0])
+    threads = []
+    line = fig.axes[0].lines[0]
+    draw = line.draw
+    line.draw = lambda renderer: (threads.append(threading.current_thread()),
+                                  draw(renderer))
+    events = []
+    canvas.mpl_connect('draw_event', events.append)
+    line.set_color('b')
+    filename = os.path.join(tempfile.mkdtemp(), 'async.png')
+    job = canvas.savefig_async(filename)
+    if threads:
+        return 'the figure was drawn before the next frame'
+    for i in range(600):
+        Clock.tick()
+        job.wait(0.1)
+        if job.done():
+            break
+    if job.state != 'done':
+        return 'export %s: %s' % (job.state, job.error)
+    if threads != [threading.main_thread()]:
+        return 'the figure was drawn on %s' % threads
+    if events or not fig.stale:
+        return 'the export was seen by the kivy canvas'
+    if not os.path.getsize(filename):
+        return 'empty file'
+
+
+def check_texture_budget():
+    '''Two agg canvases under a budget fitting one: both are kept while
+       visible, the hidden one is evicted and rendered again once shown.
+    '''
+    from kivy.clock import Clock
+    from kivy.uix.floatlayout import FloatLayout
+    from backend_kivy import texture_budget
+    from backend_kivyagg import FigureCanvasKivyAgg
+    window = offscreen.ensure_gl_context()
+    layout = FloatLayout(size=window.size)
+    canvases = [FigureCanvasKivyAgg(line_figure(), size_hint=(None, None),
+                                    pos=(i * 100, 0), size=(100, 100))
+                for i in range(2)]
+    for canvas in canvases:
+        layout.add_widget(canvas)
+    window.add_widget(layout)
+    max_bytes = texture_budget.max_bytes
+    texture_budget.max_bytes = 100 * 100 * 4
+    try:
+        for canvas in canvases:
+            canvas.draw()
+        for i in range(10):
+            Clock.tick()
+        first, second = canvases
+        if first.draw_stats['evicted'] or second.draw_stats['evicted']:
+            return 'a visible canvas was evicted'
+        if not texture_budget.stats['over_budget']:
+            return 'over_budget was not counted'
+        layout.remove_widget(first)
+        second.draw(force=True)
+        rendered = first.draw_stats['rendered']
+        for i in range(10):
+            Clock.tick()
+        if first.draw_stats['evicted'] != 1:
+            return 'the hidden canvas was not evicted'
+        if first.draw_stats['rendered'] != rendered:
+            return 'the hidden canvas was rendered again'
+        layout.add_widget(first)
+        for i in range(10):
+            Clock.tick()
+        if first.draw_stats['rendered'] != rendered + 1:
+            return 'the evicted canvas was not rendered when shown'
+    finally:
+        texture_budget.max_bytes = max_bytes
+        window.remove_widget(layout)
+
+
+def check_draw_after_print():
+    '''A change followed by a `print_png` is still rendered by the next
+       draw: printing clears `figure.stale` but not the pending change.
+    '''
+    import io
+    from backend_kivyagg import FigureCanvasKivyAgg
+    for canvas_class in (FigureCanvasKivy, FigureCanvasKivyAgg):
+        fig = line_figure()
+        canvas = canvas_class(fig, size_hint=(None, None), size=size)
+        canvas.defer_offscreen_draws = False
+        canvas.draw()
+        rendered = canvas.draw_stats['rendered']
+        fig.axes[0].lines[0].set_color('b')
+        canvas.print_png(io.BytesIO())
+        canvas.draw()
+        if canvas.draw_stats['rendered'] != rendered + 1:
+            return '%s skipped the draw after print_png' % \
+                canvas_class.__name__
+        canvas.draw()
+        if canvas.draw_stats['rendered'] != rendered + 1:
+            return '%s rendered an unchanged figure' % canvas_class.__name__
+
+
+def check_print_callbacks():
+    '''Printing draws the figure on its own agg canvas: no `draw_event` on
+       the kivy canvas and the figure stays stale.
+    '''
+    import io
+    from PIL import Image
+    fig = line_figure()
+    canvas = FigureCanvasKivy(fig)
+    events = []
+    canvas.mpl_connect('draw_event', events.append)
+    fig.axes[0].lines[0].set_color('b')
+    buf = io.BytesIO()
+    canvas.print_png(buf)
+    if events:
+        return 'print_png sent a draw_event to the kivy canvas'
+    if not fig.stale:
+        return 'print_png cleared figure.stale'
+    if fig.canvas is not canvas:
+        return 'the canvas of the figure was replaced'
+    buf.seek(0)
+    image = Image.open(buf)
+    if image.size != tuple(int(v) for v in fig.bbox.size):
+        return 'png of size %s' % (image.size, )
+
+
+checks = [check_batch_lines, check_blit, check_hover, check_savefig_async,
+          check_texture_budget, check_draw_after_print, check_print_callbacks]
+
+
+if __name__ == '__main__':
+    failed = 0
+    for check in checks:
+        try:
+            error = check()
+        except Exception as exception:
+            error = '%s: %s' % (type(exception).__name__, exception)
+        print('%s: %s' % (check.__name__, error or 'ok'))
+        failed += bool(error)
+    sys.exit(failed)
@@ -0,0 +1,48 @@
+'''Render a figure on each canvas without a display and save the snapshots.
+
+Run on a server, under `xvfb-run` or with the SDL offscreen video driver::
+
+    python offscreen_snapshot.py 800 600
+
+Writes snapshot_kivy.png, snapshot_kivyagg.png and snapshot_kivyhybrid.png
+and prints the time of each render.
+'''
+import os
+import sys
+import time
+
+# Importing from kivy.garden imports kivy, keep it from parsing the size
+# arguments.
+os.environ['KIVY_NO_ARGS'] = '1'
+from kivy.garden.matplotlib import offscreen
+offscreen.setup_headless()
+
+import numpy as np
+import matplotlib
+matplotlib.use('module://kivy.garden.matplotlib.backend_kivy')
+import matplotlib.pyplot as plt
+
+from kivy.garden.matplotlib.backend_kivy import FigureCanvasKivy
+from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg
+from kivy.garden.matplotlib.backend_kivyhybrid import FigureCanvasKivyHybrid
+
+size = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) > 2 else \
+    (800, 600)
+
+fig, ax = plt.subplots()
+x = np.linspace(0, 2 * np.pi, 400)
+ax.plot(x, np.sin(x), label='sin')
+ax.plot(x, np.cos(x), label='cos', animated=True)
+ax.set_title(r'$\sin(x)$ and $\cos(x)$')
+ax.legend()
+
+for name, canvas_class in (('kivy', FigureCanvasKivy),
+                           ('kivyagg', FigureCanvasKivyAgg),
+                           ('kivyhybrid', FigureCanvasKivyHybrid)):
+    canvas = canvas_class(fig)
+    start = time.time()
+    pixels = canvas.render_offscreen(size)
+    elapsed = time.time() - start
+    offscreen.write_png('snapshot_%s.png' % name, pixels)
+    print('%s: %d x %d in %.1f ms' % (name, pixels.shape[1], pixels.shape[0],
+                                      elapsed * 1000))
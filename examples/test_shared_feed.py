@@ -0,0 +1,55 @@
+'''Line fed from another process through a shared memory segment.
+
+The producer process computes a noisy sine wave and publishes it in the feed,
+the canvas copies the published slot and redraws when the sequence advances.
+'''
+import time
+from multiprocessing import Process, Event
+
+import numpy as np
+import matplotlib.pyplot as plt
+from kivy.app import App
+from kivy.clock import Clock
+
+from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg
+from kivy.garden.matplotlib.feeds import SharedArrayFeed
+
+N = 2048
+
+
+def produce(stop, name, shape, dtype):
+    feed = SharedArrayFeed(shape, dtype, name=name, create=False)
+    x = np.linspace(0, 4 * np.pi, shape[0])
+    phase = 0.0
+    while not stop.is_set():
+        phase += 0.05
+        feed.publish(np.sin(x + phase) + np.random.normal(0, 0.1, shape[0]))
+        time.sleep(0.005)
+    feed.close()
+
+
+class SharedFeedApp(App):
+
+    def build(self):
+        fig, ax = plt.subplots()
+        line, = ax.plot(np.arange(N), np.zeros(N))
+        ax.set_ylim(-1.5, 1.5)
+        canvas = FigureCanvasKivyAgg(fig)
+        self.feed = SharedArrayFeed((N,), 'float64')
+        canvas.attach_feed(self.feed, line.set_ydata)
+        self.stop_event = Event()
+        self.producer = Process(target=produce,
+                                args=(self.stop_event,) +
+                                self.feed.attach_args)
+        self.producer.start()
+        Clock.schedule_interval(lambda dt: print(self.feed.stats), 1.0)
+        return canvas
+
+    def on_stop(self):
+        self.stop_event.set()
+        self.producer.join()
+        self.feed.close()
+
+
+if __name__ == '__main__':
+    SharedFeedApp().run()
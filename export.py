@@ -0,0 +1,303 @@
+'''
+Export
+=====
+
+Saving of figures away from the kivy main thread. :func:`export_async` takes
+a snapshot of the figure by pickling it, which is fast, and renders and
+encodes the snapshot with agg in a worker process, so the UI keeps running
+while a large figure is saved. The canvases expose it as
+:meth:`backend_kivy.FigureCanvasKivy.savefig_async` and the toolbar saves
+with it.
+
+Figures that cannot be pickled, e.g. holding locks, threads or GPU state,
+are rendered in this process instead, by a call handed to the `schedule`
+argument so that the live figure is only drawn on the thread owning it (the
+kivy main thread for the canvases), and only the encoding of raster formats
+is done in a background thread.
+
+The file is written to a temporary file next to the target and renamed once
+complete, so a cancelled or failed export never leaves a partial file. This
+module does not depend on kivy, the workers only import matplotlib::
+
+    job = canvas.savefig_async('big.png', dpi=300,
+                               on_progress=lambda job, state: print(state))
+    job.cancel()
+
+It also holds the writers of the `print_*` methods of the canvases. They
+accept a path or any file-like object with a `write` method, e.g. a socket
+file or a `BytesIO`. The figure is drawn on a temporary agg canvas, as
+`print_figure` does, so the callbacks of the kivy canvas are not called and
+its pending changes are kept. `raw` and `rgba` write the pixels as they are
+a band of rows at a time, PNG and the other formats (`jpg`, `tif`, ...) are
+encoded by the PIL writer of matplotlib, from the pixels in place::
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cbook import CallbackRegistry
+
+STATES = ('snapshot', 'rendering', 'done', 'cancelled', 'failed')
+
+# Formats render_rgba and write_image can produce.
+RASTER_FORMATS = ('png', 'raw', 'rgba', 'jpg', 'jpeg', 'tif', 'tiff')
+
+_executor = None
+_thread_executor = None
+
+
+def default_executor():
+    '''Return the process pool shared by the exports, with one worker
+       started with `spawn` so that it does not inherit the GL context.
+    '''
+    global _executor
+    if _executor is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        _executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def thread_executor():
+    '''Return the thread pool encoding the figures that could not be
+       pickled.
+    '''
+    global _thread_executor
+    if _thread_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _thread_executor = ThreadPoolExecutor(max_workers=1)
+    return _thread_executor
+
+
+def snapshot(figure):
+    '''Return the pickled figure. The canvas is not part of it.'''
+    return pickle.dumps(figure, pickle.HIGHEST_PROTOCOL)
+
+
+def render_snapshot(data, filename, kwargs):
+    '''Unpickle a figure snapshot and save it with agg to filename. Run by
+       the workers.
+    '''
+    figure = pickle.loads(data)
+    FigureCanvasAgg(figure)
+    figure.savefig(filename, **kwargs)
+    return filename
+
+
+class ExportJob(object):
+    '''An export in progress. `state` is one of `STATES` and `future` the
+       :class:`concurrent.futures.Future` of the render. `progress` is called
+       with the job and its new state at each state change, from the thread
+       doing the change.
+    '''
+
+    def __init__(self, filename, progress=None):
+        self.filename = filename
+        self.progress = progress
+        self.state = None
+        self.error = None
+        self.future = None
+        self._temp = None
+        self._cancelled = False
+        self._done = threading.Event()
+
+    def _set_state(self, state):
+        self.state = state
+        if self.progress is not None:
+            self.progress(self, state)
+
+    def cancel(self):
+        '''Cancel the export. A render already running in a worker cannot be
+           interrupted, its output is discarded. Return False if the export
+           had already finished.
+        '''
+        if self._done.is_set():
+            return False
+        self._cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+        return True
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        '''Wait for the end of the export and return its final state.'''
+        self._done.wait(timeout)
+        return self.state
+
+    def _finished(self, future):
+        try:
+            if future.cancelled() or self._cancelled:
+                state = 'cancelled'
+            elif future.exception() is not None:
+                self.error = future.exception()
+                state = 'failed'
+            else:
+                os.replace(self._temp, self.filename)
+                state = 'done'
+        except OSError as error:
+            self.error = error
+            state = 'failed'
+        if state != 'done' and os.path.exists(self._temp):
+            os.remove(self._temp)
+        self.state = state
+        self._done.set()
+        self._set_state(state)
+
+
+def export_async(figure, filename, executor=None, progress=None,
+                 schedule=None, **kwargs):
+    '''Save figure to filename in a worker of executor, the shared process
+       pool if None, and return the :class:`ExportJob`. The keyword
+       arguments are given to `savefig`, the format defaults to the
+       extension of filename. If the figure cannot be pickled it is drawn
+       by a function without arguments given to schedule, which must call
+       it on the thread owning the figure; it is called right away if
+       schedule is None.
+    '''
+    job = ExportJob(filename, progress)
+    ext = os.path.splitext(filename)[1][1:].lower()
+    kwargs.setdefault('format', ext or rcParams['savefig.format'])
+    job._set_state('snapshot')
+    try:
+        data = snapshot(figure)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        data = None
+    fd, job._temp = tempfile.mkstemp(
+        suffix='.part', dir=os.path.dirname(os.path.abspath(filename)))
+    os.close(fd)
+    job._set_state('rendering')
+    if data is not None:
+        if executor is None:
+            executor = default_executor()
+        job.future = executor.submit(render_snapshot, data, job._temp,
+                                     kwargs)
+    else:
+        job.future = _export_in_process(figure, job._temp, kwargs,
+                                        schedule)
+    job.future.add_done_callback(job._finished)
+    return job
+
+
+def _export_in_process(figure, filename, kwargs, schedule=None):
+    '''Save a figure that could not be pickled. The figure is drawn by the
+       call given to schedule, raster formats are then encoded in
+       `thread_executor` and the other formats saved right away. Return the
+       future of the save, which can be cancelled until the draw.
+    '''
+    from concurrent.futures import Future
+    future = Future()
+
+    def chain(encoded):
+        if encoded.exception() is not None:
+            future.set_exception(encoded.exception())
+        else:
+            future.set_result(encoded.result())
+
+    def render():
+        if not future.set_running_or_notify_cancel():
+            return
+        fmt = kwargs['format'].lower()
+        try:
+            if fmt not in RASTER_FORMATS:
+                figure.savefig(filename, **kwargs)
+                future.set_result(filename)
+                return
+            dpi = kwargs.get('dpi')
+            if dpi in (None, 'figure'):
+                dpi = figure.dpi
+            rgba = render_rgba(figure, dpi)
+            thread_executor().submit(
+                write_image, filename, rgba, fmt, dpi=dpi,
+                metadata=kwargs.get('metadata'),
+                pil_kwargs=kwargs.get('pil_kwargs')).add_done_callback(chain)
+        except Exception as error:
+            future.set_exception(error)
+
+    if schedule is None:
+        render()
+    else:
+        schedule(render)
+    return future
+
+
+@contextmanager
+def _output(filename_or_obj):
+    if hasattr(filename_or_obj, 'write'):
+        yield filename_or_obj
+    else:
+        with open(filename_or_obj, 'wb') as out:
+            yield out
+
+
+def write_raw(filename_or_obj, rgba, rows_per_chunk=256):
+    '''Write the (h, w, 4) uint8 pixels rgba, top row first, unencoded.'''
+    with _output(filename_or_obj) as out:
+        for start in range(0, len(rgba), rows_per_chunk):
+            out.write(np.ascontiguousarray(
+                rgba[start:start + rows_per_chunk]).tobytes())
+
+
+class ExportCanvas(FigureCanvasAgg):
+    '''Temporary agg canvas drawing a figure for an export. Its events,
+       `draw_event` included, are not given to the callbacks of the figure,
+       i.e. to the ones connected to the canvas displaying it.
+    '''
+
+    def __init__(self, figure):
+        self._callbacks = CallbackRegistry()
+        FigureCanvasAgg.__init__(self, figure)
+
+    @property
+    def callbacks(self):
+        return self._callbacks
+
+
+def render_rgba(figure, dpi=None):
+    '''Draw figure at dpi, the one of the figure if None, on a temporary
+       agg canvas and return the (h, w, 4) uint8 pixels. The canvas of the
+       figure is put back and its `stale` flag restored, so the draw neither
+       calls the callbacks of the canvas nor hides a pending change from it.
+    '''
+    canvas = figure.canvas
+    stale = figure.stale
+    previous = figure.dpi
+    if dpi is not None and dpi != previous:
+        figure._set_dpi(dpi, forward=False)
+    try:
+        agg = ExportCanvas(figure)
+        agg.draw()
+        rgba = np.asarray(agg.buffer_rgba())
+    finally:
+        figure.set_canvas(canvas)
+        if figure.dpi != previous:
+            figure._set_dpi(previous, forward=False)
+        figure.stale = stale
+    return rgba
+
+
+def write_image(filename_or_obj, rgba, fmt, dpi=None, metadata=None,
+                pil_kwargs=None):
+    '''Write the (h, w, 4) uint8 pixels rgba in format fmt.'''
+    fmt = fmt.lower()
+    if fmt in ('raw', 'rgba'):
+        write_raw(filename_or_obj, rgba)
+        return
+    from matplotlib.image import imsave
+    imsave(filename_or_obj, rgba, format='tiff' if fmt == 'tif' else fmt,
+           dpi=dpi or rcParams['figure.dpi'], metadata=metadata,
+           pil_kwargs=pil_kwargs)
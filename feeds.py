@@ -0,0 +1,260 @@
+'''
+Feeds
+=====
+
+Hand-off of data produced outside of the kivy main thread to the canvases.
+All the matplotlib and kivy calls have to be done on the main thread, the
+producers only write into a staging area that the canvas drains once per
+frame before requesting a draw.
+
+:class:`StagingBuffer` is created with :meth:`FigureCanvasKivy.add_producer`
+and is used from reader threads::
+
+    def apply(data):
+        line.set_data(*data)
+
+    staging = canvas.add_producer(apply)
+
+    # on the reader thread
+    staging.put((x, y))
+
+Producers never wait for a render: in the default `latest` mode a new item
+replaces the one not consumed yet, in `queue` mode items are kept in order up
+to `max_pending` and the oldest are dropped. The counters are in
+:attr:`StagingBuffer.stats`.
+
+Data computed in other processes is exchanged through
+:class:`SharedArrayFeed`, a pair of array slots in a
+:mod:`multiprocessing.shared_memory` segment with a sequence counter. The
+producer process publishes arrays and the canvas copies the last published
+slot, a single memory copy, once per frame::
+
+    # UI process
+    feed = SharedArrayFeed((4096,), 'float64')
+    canvas.attach_feed(feed, lambda y: line.set_ydata(y))
+    Process(target=produce, args=feed.attach_args).start()
+
+    # producer process
+    def produce(name, shape, dtype):
+        feed = SharedArrayFeed(shape, dtype, name=name, create=False)
+        while True:
+            feed.publish(compute())
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import threading
+
+import numpy as np
+
+
+class StagingBuffer(object):
+    '''Double buffer between producer threads and the main thread. Producers
+       append to the back buffer, the consumer swaps it with an empty one.
+       The lock is only held for an append or a swap, so neither side waits
+       for the other to process data.
+
+       `mode` is either 'latest' (coalesce, only the last item put since the
+       previous swap is kept) or 'queue' (every item is kept, up to
+       `max_pending`, the oldest being dropped first).
+    '''
+
+    def __init__(self, mode='latest', max_pending=1024):
+        if mode not in ('latest', 'queue'):
+            raise ValueError('mode ' + mode + ' not valid')
+        self.mode = mode
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._back = []
+        self.stats = {'put': 0, 'coalesced': 0, 'dropped': 0, 'swaps': 0,
+                      'applied': 0, 'max_pending': 0}
+
+    def __len__(self):
+        return len(self._back)
+
+    def put(self, item):
+        '''Stage an item. Can be called from any thread and never blocks on
+           the consumer.
+        '''
+        with self._lock:
+            self.stats['put'] += 1
+            if self.mode == 'latest':
+                self.stats['coalesced'] += len(self._back)
+                self._back = [item]
+            else:
+                self._back.append(item)
+                if len(self._back) > self.max_pending:
+                    del self._back[0]
+                    self.stats['dropped'] += 1
+            self.stats['max_pending'] = max(self.stats['max_pending'],
+                                            len(self._back))
+
+    def swap(self):
+        '''Return the staged items, oldest first, and start a new buffer.
+        '''
+        with self._lock:
+            front, self._back = self._back, []
+        if front:
+            self.stats['swaps'] += 1
+        return front
+
+
+class SharedArrayFeed(object):
+    '''Arrays of up to `shape` items of `dtype` exchanged between processes
+       through a shared memory segment. The segment holds a header and two
+       slots: :meth:`publish` writes the slot not currently published then
+       flips the active slot and increments the sequence counter,
+       :meth:`poll` returns a copy of the active slot when the sequence
+       advanced. Rows beyond the published length are not part of the copy.
+
+       The producer writes the published slot again after two more
+       publishes, so the array is copied out of the segment and the copy is
+       discarded (counted as `torn`) if the sequence advanced meanwhile; the
+       draw using it may happen frames later. Either side can create the
+       segment; the other attaches to it with
+       `create=False` and the `name` of the segment, see `attach_args`.
+    '''
+
+    # seq, active slot, length of slot 0, length of slot 1
+    _header_items = 4
+
+    def __init__(self, shape, dtype='float64', name=None, create=True):
+        shared_memory = _shared_memory()
+        if shared_memory is None:
+            raise ImportError("shared memory feeds require Python 3.8 or "
+                              "later.")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        header_bytes = self._header_items * 8
+        slot_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        if create:
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=header_bytes + 2 * slot_bytes)
+        else:
+            self.shm = _attach_shared_memory(name)
+        self.owner = create
+        self._header = np.ndarray((self._header_items,), np.int64,
+                                  buffer=self.shm.buf)
+        self._slots = np.ndarray((2,) + self.shape, self.dtype,
+                                 buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = 0
+        self._seq = int(self._header[0])
+        self.stats = {'published': 0, 'received': 0, 'skipped': 0,
+                      'applied': 0, 'torn': 0}
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def attach_args(self):
+        '''Arguments to give to another process to attach to the feed.'''
+        return (self.name, self.shape, self.dtype.str)
+
+    @property
+    def sequence(self):
+        return int(self._header[0])
+
+    def publish(self, array):
+        '''Copy array in the free slot and make it the published one.'''
+        array = np.asarray(array, dtype=self.dtype)
+        n = len(array)
+        if n > self.shape[0]:
+            raise ValueError('array of %d items does not fit a feed of %d'
+                             % (n, self.shape[0]))
+        slot = 1 - int(self._header[1])
+        self._slots[slot, :n] = array
+        self._header[2 + slot] = n
+        self._header[1] = slot
+        # The counter is written last, a reader seeing it advance sees the
+        # new slot.
+        self._header[0] += 1
+        self.stats['published'] += 1
+
+    def poll(self):
+        '''Return a copy of the last published array if the sequence
+           advanced since the previous poll, None otherwise.
+        '''
+        seq = int(self._header[0])
+        if seq == self._seq:
+            return None
+        slot = int(self._header[1])
+        n = int(self._header[2 + slot])
+        array = self._slots[slot, :n].copy()
+        if int(self._header[0]) != seq:
+            # Published again while reading, the slot may have been
+            # overwritten during the copy. Retry next frame.
+            self.stats['torn'] += 1
+            return None
+        self.stats['skipped'] += max(seq - self._seq - 1, 0)
+        self.stats['received'] += 1
+        self._seq = seq
+        return array
+
+    def swap(self):
+        '''Same interface as :meth:`StagingBuffer.swap` so the feed can be
+           drained by the canvases.
+        '''
+        array = self.poll()
+        return [] if array is None else [array]
+
+    def close(self):
+        '''Release the mapping, and the segment if this side created it.'''
+        self._header = self._slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _shared_memory():
+    '''Return :mod:`multiprocessing.shared_memory`, imported on first use
+       so that importing the backends does not load multiprocessing, or
+       None before Python 3.8.
+    '''
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        return None
+    return shared_memory
+
+
+def _attach_shared_memory(name):
+    '''Attach to an existing segment without registering it to the
+       resource tracker of this process, which would otherwise unlink it
+       when this process exits.
+    '''
+    shared_memory = _shared_memory()
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+    except ImportError:
+        return shm
+    # A tracker inherited from the process that created the segment holds
+    # one entry per name, unregistering it here would make the unlink of
+    # the creator fail in the tracker.
+    if _owns_resource_tracker(resource_tracker):
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _owns_resource_tracker(resource_tracker):
+    '''Return whether the resource tracker was started by this process,
+       rather than inherited from its parent.
+    '''
+    pid = getattr(resource_tracker._resource_tracker, '_pid', None)
+    if pid is None:
+        # Spawned children only receive the pipe of the tracker.
+        return False
+    try:
+        os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        # Forked children inherit the pid of a tracker they did not start.
+        return False
+    return True
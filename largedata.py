@@ -0,0 +1,231 @@
+'''
+Large Data
+=====
+
+Line artist for recordings too large to be plotted sample by sample, e.g.
+memory mapped `.npy` or raw binary files of several GB. On every draw
+:class:`MemmapLine` reads only the samples inside the current x limits and,
+when there are more samples than pixels, reduces them to the minimum and the
+maximum of every pixel column. Chunks of the file that were read recently are
+kept in a cache of bounded size so panning back and forth does not hit the
+disk again.
+
+Example::
+
+    y = np.load('recording.npy', mmap_mode='r')
+    line = plot_memmap(ax, y, x0=0.0, dx=1.0 / 48000)
+
+    # raw binary file
+    y = np.memmap('recording.f32', dtype='float32', mode='r')
+    line = plot_memmap(ax, y, x=timestamps)
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.lines import Line2D
+
+
+class ChunkCache(object):
+    '''Least recently used cache of fixed size chunks of a 1D array, holding
+       at most `max_bytes` bytes.
+    '''
+
+    def __init__(self, array, chunk_size=1 << 18, max_bytes=64 << 20):
+        self.array = array
+        self.chunk_size = int(chunk_size)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._chunks = OrderedDict()
+        self._heads = None
+
+    def chunk(self, i):
+        data = self._chunks.pop(i, None)
+        if data is None:
+            self.misses += 1
+            start = i * self.chunk_size
+            data = np.array(self.array[start:start + self.chunk_size])
+            self.nbytes += data.nbytes
+            while self._chunks and self.nbytes > self.max_bytes:
+                self.nbytes -= self._chunks.popitem(last=False)[1].nbytes
+        else:
+            self.hits += 1
+        self._chunks[i] = data
+        return data
+
+    def slice(self, start, stop):
+        '''Yield (offset, data) pieces covering array[start:stop].'''
+        size = self.chunk_size
+        for i in range(start // size, (stop - 1) // size + 1):
+            data = self.chunk(i)
+            lo = max(start - i * size, 0)
+            hi = min(stop - i * size, len(data))
+            yield i * size + lo, data[lo:hi]
+
+    def take(self, indices):
+        '''Return array[indices] for increasing integer indices.'''
+        indices = np.asarray(indices, dtype=np.int64)
+        chunks = indices // self.chunk_size
+        out = np.empty(len(indices), self.array.dtype)
+        for i in np.unique(chunks):
+            sel = chunks == i
+            out[sel] = self.chunk(i)[indices[sel] - i * self.chunk_size]
+        return out
+
+    def searchsorted(self, values, side='left'):
+        '''`numpy.searchsorted` of values in the sorted array. The first
+           sample of every chunk is read once to find the chunk of each
+           value, only those chunks are then read.
+        '''
+        if self._heads is None:
+            self._heads = np.array(self.array[::self.chunk_size])
+        values = np.atleast_1d(values)
+        chunks = np.maximum(np.searchsorted(self._heads, values, side) - 1, 0)
+        out = np.empty(len(values), np.int64)
+        for i in np.unique(chunks):
+            sel = chunks == i
+            out[sel] = i * self.chunk_size + np.searchsorted(
+                self.chunk(i), values[sel], side)
+        return out
+
+
+def envelope(cache, edges):
+    '''Return the minimum and the maximum of the samples of each bin, bins
+       being delimited by the strictly increasing sample indices `edges`.
+       The samples are read chunk by chunk through `cache`.
+    '''
+    nbins = len(edges) - 1
+    lo = np.full(nbins, np.inf)
+    hi = np.full(nbins, -np.inf)
+    for offset, data in cache.slice(int(edges[0]), int(edges[-1])):
+        stop = offset + len(data)
+        b0 = np.searchsorted(edges, offset, side='right') - 1
+        b1 = np.searchsorted(edges, stop - 1, side='right') - 1
+        starts = np.maximum(edges[b0:b1 + 1], offset) - offset
+        mn = np.fmin.reduceat(data, starts)
+        mx = np.fmax.reduceat(data, starts)
+        lo[b0:b1 + 1] = np.fmin(lo[b0:b1 + 1], mn)
+        hi[b0:b1 + 1] = np.fmax(hi[b0:b1 + 1], mx)
+    lo[~np.isfinite(lo)] = np.nan
+    hi[~np.isfinite(hi)] = np.nan
+    return lo, hi
+
+
+class MemmapLine(Line2D):
+    '''Line2D drawing a large 1D array `y`, typically a :class:`numpy.memmap`.
+       The x coordinates are either regularly spaced, from `x0` with a step
+       `dx`, or given by an increasing array `x` of the same length (which
+       can be memory mapped too). Only the samples inside the x limits of the
+       axes are read, and reduced to per pixel envelopes when they outnumber
+       the pixels. `chunk_size` and `max_bytes` configure the cache of the
+       samples read.
+    '''
+
+    def __init__(self, y, x=None, x0=0.0, dx=1.0, chunk_size=1 << 18,
+                 max_bytes=64 << 20, **kwargs):
+        Line2D.__init__(self, [], [], **kwargs)
+        self._y_cache = ChunkCache(y, chunk_size, max_bytes)
+        self._x_cache = ChunkCache(x, chunk_size, max_bytes) \
+            if x is not None else None
+        self._x0 = float(x0)
+        self._dx = float(dx)
+        self._view_key = None
+
+    def __len__(self):
+        return len(self._y_cache.array)
+
+    def get_data_limits(self):
+        '''Return (xmin, xmax) of the whole recording.'''
+        n = len(self)
+        if self._x_cache is not None:
+            x = self._x_cache.array
+            return float(x[0]), float(x[n - 1])
+        return self._x0, self._x0 + self._dx * (n - 1)
+
+    def _index_range(self, xmin, xmax):
+        n = len(self)
+        if self._x_cache is None:
+            i0 = int(np.floor((xmin - self._x0) / self._dx))
+            i1 = int(np.ceil((xmax - self._x0) / self._dx)) + 1
+        else:
+            i0 = int(self._x_cache.searchsorted(xmin, side='left')[0])
+            i1 = int(self._x_cache.searchsorted(xmax, side='right')[0])
+        # One sample on each side so the line reaches the borders.
+        return max(i0 - 1, 0), min(i1 + 1, n)
+
+    def _x_at(self, indices):
+        if self._x_cache is None:
+            return self._x0 + self._dx * np.asarray(indices, dtype=float)
+        return self._x_cache.take(indices).astype(float)
+
+    def _samples(self, i0, i1, cache):
+        return np.concatenate([data for offset, data in cache.slice(i0, i1)])
+
+    def _update_view(self):
+        '''Read the samples of the visible x range and set them, or their
+           envelopes, as the data of the line.
+        '''
+        ax = self.axes
+        xmin, xmax = sorted(ax.get_xlim())
+        width = max(int(ax.bbox.width), 1)
+        key = (xmin, xmax, width)
+        if key == self._view_key:
+            return
+        self._view_key = key
+        i0, i1 = self._index_range(xmin, xmax)
+        if i1 <= i0:
+            self.set_data([], [])
+            return
+        if i1 - i0 <= 2 * width:
+            xs = self._x_at(np.arange(i0, i1))
+            ys = self._samples(i0, i1, self._y_cache)
+            self.set_data(xs, ys)
+            return
+        if self._x_cache is None:
+            edges = np.linspace(i0, i1, width + 1).astype(np.int64)
+        else:
+            pixels = np.linspace(xmin, xmax, width + 1)
+            edges = self._x_cache.searchsorted(pixels[1:-1])
+            edges = np.concatenate(([i0], edges, [i1]))
+        edges = np.unique(np.clip(edges, i0, i1))
+        lo, hi = envelope(self._y_cache, edges)
+        xs = self._x_at(edges[:-1])
+        self.set_data(np.repeat(xs, 2), np.column_stack((lo, hi)).ravel())
+
+    def draw(self, renderer):
+        if self.axes is not None and len(self):
+            self._update_view()
+        Line2D.draw(self, renderer)
+
+    def cache_info(self):
+        '''Return the hits, misses and bytes of the sample caches.'''
+        caches = [self._y_cache]
+        if self._x_cache is not None:
+            caches.append(self._x_cache)
+        return {'hits': sum(c.hits for c in caches),
+                'misses': sum(c.misses for c in caches),
+                'nbytes': sum(c.nbytes for c in caches)}
+
+
+def plot_memmap(ax, y, x=None, x0=0.0, dx=1.0, **kwargs):
+    '''Add a :class:`MemmapLine` of `y` to `ax` and set the x limits to the
+       whole recording. The y limits are set from a coarse envelope of the
+       data so the whole file is not read for autoscaling.
+    '''
+    line = MemmapLine(y, x=x, x0=x0, dx=dx, **kwargs)
+    ax.add_line(line)
+    xmin, xmax = line.get_data_limits()
+    ax.set_xlim(xmin, xmax)
+    n = len(y)
+    step = max(n // 4096, 1)
+    sample = np.asarray(y[::step], dtype=float)
+    if len(sample) and np.isfinite(sample).any():
+        ymin, ymax = np.nanmin(sample), np.nanmax(sample)
+        margin = (ymax - ymin) * 0.05 or 1.0
+        ax.set_ylim(ymin - margin, ymax + margin)
+    return line
@@ -0,0 +1,315 @@
+'''
+Line Engine
+=====
+
+Batched drawing of the strokes of :class:`backend_kivy.RendererKivy`. A
+:class:`kivy.graphics.Line` computes the geometry of its joins, caps and
+dashes on the CPU, which makes thick or dashed lines slow in bulk. The engine
+instead packs every segment of consecutive strokes sharing a style and a clip
+target in one vertex buffer. Each segment is a quad carrying both end points
+and the width, caps, joins, dashes and antialiasing are computed by the
+shaders of a :class:`kivy.graphics.RenderContext`. A thousand lines of the
+same style are drawn by a handful of meshes (a mesh holds up to 16383
+segments).
+
+Segments overlap at the joins, so only opaque strokes with dash patterns of up
+to 4 dashes are batched; :meth:`LineEngine.accepts` tells which strokes the
+renderer can give to the engine, the other ones are drawn with `Line`. Round
+joins are exact, miter and bevel joins are drawn as square extensions of the
+segments. The shaders only use OpenGL ES 2 features and run on software
+renderers such as Mesa llvmpipe.
+
+The engine is enabled per canvas with :attr:`FigureCanvasKivy.batch_lines`.
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+from kivy.graphics import RenderContext, Color, Mesh
+
+VERTEX_SHADER = '''
+#ifdef GL_ES
+    precision highp float;
+#endif
+
+attribute vec2 v_start;
+attribute vec2 v_end;
+attribute vec2 v_corner;
+attribute vec2 v_caps;
+attribute float v_dist;
+
+uniform mat4 modelview_mat;
+uniform mat4 projection_mat;
+uniform vec4 color;
+uniform float opacity;
+uniform float half_width;
+
+varying vec4 frag_color;
+varying vec2 local;
+varying vec2 caps;
+varying float seg_length;
+varying float dist;
+
+void main(void) {
+    vec2 delta = v_end - v_start;
+    seg_length = length(delta);
+    vec2 dir = seg_length > 0.0 ? delta / seg_length : vec2(1.0, 0.0);
+    vec2 normal = vec2(-dir.y, dir.x);
+    // One more pixel around the stroke for the antialiasing.
+    float ext = half_width + 1.0;
+    local = vec2(v_corner.x * seg_length + (2.0 * v_corner.x - 1.0) * ext,
+                 v_corner.y * ext);
+    caps = v_caps;
+    dist = v_dist;
+    frag_color = color * vec4(1.0, 1.0, 1.0, opacity);
+    vec2 pos = v_start + dir * local.x + normal * local.y;
+    gl_Position = projection_mat * modelview_mat * vec4(pos, 0.0, 1.0);
+}
+'''
+
+FRAGMENT_SHADER = '''
+#ifdef GL_ES
+    precision highp float;
+#endif
+
+varying vec4 frag_color;
+varying vec2 local;
+varying vec2 caps;
+varying float seg_length;
+varying float dist;
+
+uniform float half_width;
+uniform vec4 dash_a;
+uniform vec4 dash_b;
+uniform float dash_period;
+uniform float dash_offset;
+
+// Distance to the stroke of a point x pixels past the end of a segment and
+// y pixels from its axis: 0 is a butt end, 1 a square end, 2 a round end.
+float end_distance(float x, float y, float kind) {
+    if (kind > 1.5) {
+        return length(vec2(x, y));
+    }
+    if (kind > 0.5) {
+        return max(x, y);
+    }
+    return max(x + half_width, y);
+}
+
+void main(void) {
+    float x = local.x;
+    float y = abs(local.y);
+    float d = y;
+    if (x < 0.0) {
+        d = end_distance(-x, y, caps.x);
+    } else if (x > seg_length) {
+        d = end_distance(x - seg_length, y, caps.y);
+    }
+    float coverage = clamp(half_width + 0.5 - d, 0.0, 1.0);
+    if (dash_period > 0.0) {
+        float s = mod(dist + clamp(x, 0.0, seg_length) + dash_offset,
+                      dash_period);
+        float e1 = dash_a.x;
+        float e2 = e1 + dash_a.y;
+        float e3 = e2 + dash_a.z;
+        float e4 = e3 + dash_a.w;
+        float e5 = e4 + dash_b.x;
+        float e6 = e5 + dash_b.y;
+        float e7 = e6 + dash_b.z;
+        bool on = s < e1 || (s >= e2 && s < e3) || (s >= e4 && s < e5) ||
+                  (s >= e6 && s < e7);
+        if (!on) {
+            discard;
+        }
+    }
+    if (coverage <= 0.0) {
+        discard;
+    }
+    gl_FragColor = vec4(frag_color.rgb, frag_color.a * coverage);
+}
+'''
+
+VERTEX_FORMAT = [(b'v_start', 2, 'float'), (b'v_end', 2, 'float'),
+                 (b'v_corner', 2, 'float'), (b'v_caps', 2, 'float'),
+                 (b'v_dist', 1, 'float')]
+
+# Mesh indices are unsigned shorts, 4 vertices per segment.
+MAX_SEGMENTS = 16383
+
+_CORNERS = np.array([(0, -1), (0, 1), (1, 1), (1, -1)], dtype=np.float32)
+_QUAD_INDICES = np.array([0, 1, 2, 2, 3, 0], dtype=np.int64)
+
+_cap_kinds = {'butt': 0.0, 'projecting': 1.0, 'round': 2.0}
+_join_kinds = {'miter': 1.0, 'bevel': 1.0, 'round': 2.0}
+
+
+def segment_vertices(points, start_kind, end_kind, join_kind):
+    '''Return the (4 * segments, 9) vertices of the polyline `points`, a
+       (n, 2) array, in the layout of `VERTEX_FORMAT`. The first and last
+       segments get the kinds `start_kind` and `end_kind` at the ends of the
+       polyline, the other ends get `join_kind`.
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points) - 1
+    lengths = np.hypot(*(points[1:] - points[:-1]).T)
+    dist = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    caps = np.full((n, 2), join_kind)
+    caps[0, 0] = start_kind
+    caps[-1, 1] = end_kind
+    seg = np.hstack((points[:-1], points[1:]))
+    vertices = np.empty((n, 4, 9), dtype=np.float32)
+    vertices[:, :, 0:4] = seg[:, None, :]
+    vertices[:, :, 4:6] = _CORNERS
+    vertices[:, :, 6:8] = caps[:, None, :]
+    vertices[:, :, 8] = dist[:, None]
+    return vertices.reshape(-1, 9)
+
+
+class LineBatch(object):
+    '''Segments of one style drawn on one canvas, in a RenderContext.'''
+
+    def __init__(self, canvas, context, style):
+        self.canvas = canvas
+        self.context = context
+        self.style = style
+        self.vertices = []
+
+    def build(self):
+        '''Create the meshes of the segments added to the batch.'''
+        rgba = self.style[0]
+        vertices = np.concatenate(self.vertices)
+        self.vertices = []
+        segments = len(vertices) // 4
+        meshes = 0
+        with self.context:
+            Color(*rgba)
+            for start in range(0, segments, MAX_SEGMENTS):
+                count = min(MAX_SEGMENTS, segments - start)
+                indices = (_QUAD_INDICES[None, :] +
+                           4 * np.arange(count)[:, None]).ravel()
+                Mesh(vertices=vertices[4 * start:4 * (start + count)]
+                     .ravel().tolist(),
+                     indices=indices.tolist(), fmt=VERTEX_FORMAT,
+                     mode=str('triangles'))
+                meshes += 1
+        return segments, meshes
+
+
+class LineEngine(object):
+    '''Batches the strokes given by a renderer into :class:`LineBatch`
+       objects. Consecutive strokes of the same style drawn on the same
+       canvas go in the same batch, as long as nothing else was added to the
+       canvas in between, so the stacking order of the figure is kept.
+
+       The RenderContexts are reused from one render to the next to avoid
+       compiling the shaders again; :meth:`begin` has to be called when the
+       canvases were cleared and :meth:`flush` when the render is done.
+    '''
+
+    max_dashes = 8
+
+    def __init__(self):
+        self._contexts = []
+        self._used = 0
+        self._open = {}
+        self.stats = {'strokes': 0, 'segments': 0, 'batches': 0,
+                      'meshes': 0, 'shaders': 0}
+
+    def accepts(self, gc):
+        '''Return whether the stroke of gc can be batched.'''
+        if gc.get_linewidth() <= 0:
+            return False
+        if len(gc.get_rgb()) > 3 and gc.get_rgb()[3] < 1.0:
+            return False
+        offset, dashes = gc.get_dashes()
+        if dashes is None:
+            return True
+        # Odd patterns are repeated to get pairs of dashes and gaps.
+        return len(dashes) * (1 + len(dashes) % 2) <= self.max_dashes
+
+    def style(self, renderer, gc):
+        '''Return the hashable style of the stroke of gc, in pixels.'''
+        rgba = tuple(float(c) for c in gc.get_rgb())
+        if len(rgba) == 3:
+            rgba += (1.0,)
+        width = float(renderer.points_to_pixels(gc.get_linewidth()))
+        offset, dashes = gc.get_dashes()
+        if dashes is not None and len(dashes):
+            dashes = tuple(float(renderer.points_to_pixels(d))
+                           for d in dashes)
+            if len(dashes) % 2:
+                dashes = dashes * 2
+            offset = float(renderer.points_to_pixels(offset or 0))
+        else:
+            dashes, offset = (), 0.0
+        return (rgba, width, str(gc.get_capstyle()), str(gc.get_joinstyle()),
+                dashes, offset)
+
+    def begin(self):
+        '''Forget the batches of the previous render, whose canvases were
+           cleared, and make their RenderContexts available again.
+        '''
+        self._open = {}
+        self._used = 0
+
+    def add(self, canvas, style, points, closed=False):
+        '''Add the polyline `points`, a (n, 2) array in canvas coordinates,
+           to the batch of `style` on `canvas`.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        if len(points) < 2:
+            return
+        batch = self._open.get(canvas)
+        children = canvas.children
+        if batch is None or batch.style != style or not children or \
+                children[-1] is not batch.context:
+            if batch is not None:
+                self._build(batch)
+            batch = self._open[canvas] = LineBatch(canvas, self._context(),
+                                                   style)
+            self._set_uniforms(batch.context, style)
+            canvas.add(batch.context)
+            self.stats['batches'] += 1
+        rgba, width, capstyle, joinstyle, dashes, offset = style
+        join = _join_kinds.get(joinstyle, 1.0)
+        cap = join if closed else _cap_kinds.get(capstyle, 0.0)
+        batch.vertices.append(segment_vertices(points, cap, cap, join))
+        self.stats['strokes'] += 1
+
+    def flush(self):
+        '''Build the meshes of the open batches.'''
+        for batch in self._open.values():
+            self._build(batch)
+        self._open = {}
+
+    def _build(self, batch):
+        if batch.vertices:
+            segments, meshes = batch.build()
+            self.stats['segments'] += segments
+            self.stats['meshes'] += meshes
+
+    def _context(self):
+        if self._used == len(self._contexts):
+            # Both stages are compiled and linked together: setting them one
+            # at a time links a stage with the default shader of the other,
+            # which fails since they share custom varyings.
+            context = RenderContext(use_parent_projection=True,
+                                    use_parent_modelview=True,
+                                    vs=VERTEX_SHADER, fs=FRAGMENT_SHADER)
+            self._contexts.append(context)
+            self.stats['shaders'] += 1
+        context = self._contexts[self._used]
+        self._used += 1
+        context.clear()
+        return context
+
+    def _set_uniforms(self, context, style):
+        rgba, width, capstyle, joinstyle, dashes, offset = style
+        pattern = list(dashes) + [0.0] * (8 - len(dashes))
+        context['half_width'] = width / 2.0
+        context['dash_a'] = pattern[:4]
+        context['dash_b'] = pattern[4:]
+        context['dash_period'] = float(sum(dashes))
+        context['dash_offset'] = offset
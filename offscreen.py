@@ -0,0 +1,79 @@
+'''
+Offscreen
+=====
+
+Rendering of the canvases without a display, e.g. on CI or on servers. The
+instructions of a canvas are drawn into a :class:`kivy.graphics.Fbo` of the
+requested size and the pixels are read back as a numpy array or written as a
+PNG file, see :meth:`backend_kivy.FigureCanvasKivy.render_offscreen`. This
+works for the vector, agg and hybrid canvases alike and never draws in the
+window.
+
+A GL context is still needed. :func:`setup_headless` configures kivy to
+create a hidden window, using the SDL `offscreen` video driver when there is
+no display, and must be called before the window is created, i.e. before the
+canvases are imported. Under a virtual X server (`xvfb-run`) the hidden
+window is enough.
+
+This module only imports the kivy configuration. Importing it from
+`kivy.garden.matplotlib` imports `kivy` itself, which parses the command
+line unless `KIVY_NO_ARGS` is set, so set it in the environment when the
+arguments are not meant for kivy::
+
+    os.environ['KIVY_NO_ARGS'] = '1'
+    from kivy.garden.matplotlib import offscreen
+    offscreen.setup_headless()
+
+    from kivy.garden.matplotlib.backend_kivy import FigureCanvasKivy
+    canvas = FigureCanvasKivy(fig)
+    pixels = canvas.render_offscreen(size=(800, 600))
+    canvas.save_offscreen('snapshot.png', size=(800, 600))
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+import numpy as np
+
+
+def setup_headless(offscreen=None):
+    '''Configure kivy to render without showing a window. If offscreen is
+       None the SDL offscreen video driver is used when neither `DISPLAY`
+       nor `WAYLAND_DISPLAY` are set. Must be called before the window is
+       created, the environment variables already set are kept.
+       `KIVY_NO_ARGS` is only set for a `kivy` not imported yet.
+    '''
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    if offscreen is None:
+        offscreen = not (os.environ.get('DISPLAY') or
+                         os.environ.get('WAYLAND_DISPLAY'))
+    if offscreen:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+    from kivy.config import Config
+    Config.set('graphics', 'window_state', 'hidden')
+
+
+def ensure_gl_context():
+    '''Create the (hidden) window and its GL context if there is none yet,
+       and return the window.
+    '''
+    from kivy.base import EventLoop
+    EventLoop.ensure_window()
+    return EventLoop.window
+
+
+def read_pixels(fbo):
+    '''Return the (h, w, 4) uint8 RGBA pixels of fbo, top row first.'''
+    w, h = fbo.size
+    pixels = np.frombuffer(fbo.pixels, np.uint8).reshape(h, w, 4)
+    return np.ascontiguousarray(pixels[::-1])
+
+
+def write_png(filename, pixels):
+    '''Write the (h, w, 4) uint8 pixels to filename, a path or a file-like
+       object, as PNG.
+    '''
+    from matplotlib.image import imsave
+    imsave(filename, pixels, format='png')
@@ -0,0 +1,156 @@
+'''
+Quality
+=====
+
+Adaptive render quality of the canvases. :class:`AdaptiveQuality` keeps a
+moving average of the render times of a canvas and, while the user interacts
+with it and the renders take longer than `budget`, steps down to the next of
+its quality tiers. Once the canvas has not been touched for `idle_delay`
+seconds the full quality is restored and the figure is rendered again.
+
+A tier is a dict with the following keys:
+
+    `name`
+        Shown in the stats.
+    `dpi_scale`
+        Factor of the figure dpi for the renders of the agg canvas. The
+        smaller render is stretched over the widget.
+    `antialiased`
+        When False the paths and the text are drawn without antialiasing.
+    `simplify_threshold`
+        Minimum `path.simplify_threshold` of the paths drawn, None to keep
+        the one of the paths.
+    `skip_text`
+        When True no text is drawn.
+
+The tiers, the budget and the delays can be changed on the `quality` of a
+canvas, and the current tier is `quality.tier` (index) and `quality.current`
+(dict)::
+
+    canvas.adaptive_quality = True
+    canvas.quality.budget = 1 / 30.
+    canvas.quality.tiers[1]['simplify_threshold'] = 1.0
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from contextlib import contextmanager
+
+from matplotlib import rc_context
+
+DEFAULT_TIERS = (
+    {'name': 'full', 'dpi_scale': 1.0, 'antialiased': True,
+     'simplify_threshold': None, 'skip_text': False},
+    {'name': 'aliased', 'dpi_scale': 1.0, 'antialiased': False,
+     'simplify_threshold': 0.5, 'skip_text': False},
+    {'name': 'draft', 'dpi_scale': 0.75, 'antialiased': False,
+     'simplify_threshold': 1.0, 'skip_text': True},
+    {'name': 'minimal', 'dpi_scale': 0.5, 'antialiased': False,
+     'simplify_threshold': 2.0, 'skip_text': True},
+)
+
+
+class AdaptiveQuality(object):
+    '''Choose the quality tier of the renders of a canvas from its recent
+       render times. `budget` is the render time in seconds above which the
+       quality is lowered, `smoothing` the weight of the last render in the
+       moving average and `idle_delay` the time without interaction after
+       which the full quality is restored.
+    '''
+
+    def __init__(self, budget=0.016, tiers=None, smoothing=0.3,
+                 idle_delay=0.3):
+        self.budget = budget
+        self.tiers = [dict(tier) for tier in (tiers or DEFAULT_TIERS)]
+        self.smoothing = smoothing
+        self.idle_delay = idle_delay
+        self.tier = 0
+        self.render_time = None
+        self.stats = {'renders': 0, 'degraded_renders': 0, 'step_downs': 0,
+                      'restores': 0, 'tier': self.tiers[0]['name']}
+
+    @property
+    def current(self):
+        return self.tiers[self.tier]
+
+    def record(self, elapsed, interacting):
+        '''Account for a render of `elapsed` seconds and step down one tier
+           if the average is over budget during an interaction. Return True
+           if the tier changed.
+        '''
+        self.stats['renders'] += 1
+        if self.tier:
+            self.stats['degraded_renders'] += 1
+        if self.render_time is None:
+            self.render_time = elapsed
+        else:
+            self.render_time += self.smoothing * (elapsed - self.render_time)
+        if interacting and self.render_time > self.budget and \
+                self.tier < len(self.tiers) - 1:
+            self.tier += 1
+            # The times measured at the previous tier do not apply anymore.
+            self.render_time = None
+            self.stats['step_downs'] += 1
+            self.stats['tier'] = self.current['name']
+            return True
+        return False
+
+    def restore(self):
+        '''Go back to the first tier. Return True if the tier changed.'''
+        if not self.tier:
+            return False
+        self.tier = 0
+        self.render_time = None
+        self.stats['restores'] += 1
+        self.stats['tier'] = self.current['name']
+        return True
+
+    @contextmanager
+    def apply(self, renderer):
+        '''Apply the current tier to the draws done with `renderer` inside
+           the context, by overriding methods of the renderer instance.
+        '''
+        tier = self.current
+        overrides = {}
+        if not tier['antialiased']:
+            new_gc = renderer.new_gc
+
+            def aliased_gc():
+                gc = new_gc()
+                gc.set_antialiased(False)
+                gc.set_antialiased = lambda b: None
+                return gc
+            overrides['new_gc'] = aliased_gc
+        threshold = tier['simplify_threshold']
+        if threshold is not None:
+            draw_path = renderer.draw_path
+
+            def simplified_path(gc, path, transform, rgbFace=None):
+                if not path.should_simplify or \
+                        path.simplify_threshold >= threshold:
+                    return draw_path(gc, path, transform, rgbFace)
+                previous = path.simplify_threshold
+                path.simplify_threshold = threshold
+                try:
+                    return draw_path(gc, path, transform, rgbFace)
+                finally:
+                    path.simplify_threshold = previous
+            overrides['draw_path'] = simplified_path
+        if tier['skip_text']:
+            overrides['draw_text'] = lambda *args, **kwargs: None
+            overrides['draw_tex'] = lambda *args, **kwargs: None
+        # Some renderers bind methods of their C++ renderer per instance.
+        saved = dict((name, vars(renderer)[name]) for name in overrides
+                     if name in vars(renderer))
+        for name, method in overrides.items():
+            setattr(renderer, name, method)
+        rc = {} if tier['antialiased'] else {'text.antialiased': False}
+        try:
+            with rc_context(rc):
+                yield tier
+        finally:
+            for name in overrides:
+                delattr(renderer, name)
+            for name, method in saved.items():
+                setattr(renderer, name, method)
@@ -0,0 +1,214 @@
+'''
+Shader Image
+=====
+
+Fast path of `imshow` for scalar fields on :class:`FigureCanvasKivy`. Instead
+of colormapping the data with matplotlib and uploading 4 bytes per pixel on
+every change, the data is uploaded once as a single channel texture and a 256
+entries colormap lookup texture is applied by a fragment shader. Changing the
+color limits only updates uniforms of the shader and changing the colormap
+uploads 1 KB, the data texture is uploaded again only when the data changes.
+
+The scalars are quantized to 16 bits over their range and packed in a
+`luminance_alpha` texture of unsigned bytes, value 0 marking invalid data. This
+only needs OpenGL ES 2 features, so it also works with software renderers
+such as Mesa llvmpipe. Only linear normalizations on linear axes are shaded,
+other images are drawn by matplotlib as usual.
+
+Example::
+
+    image = imshow_scalar(ax, field, cmap='viridis')
+    image.set_clim(0.2, 0.8)   # no upload
+    image.set_data(new_field)  # one upload of 2 bytes per pixel
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+from matplotlib.image import AxesImage
+from matplotlib.colors import Normalize
+
+from kivy.graphics import RenderContext, BindTexture, Color, Rectangle
+from kivy.graphics.texture import Texture
+
+FRAGMENT_SHADER = '''
+$HEADER$
+uniform sampler2D lut;
+uniform float vmin;
+uniform float vmax;
+uniform vec4 under_color;
+uniform vec4 over_color;
+uniform vec4 bad_color;
+
+void main(void) {
+    vec4 texel = texture2D(texture0, tex_coord0);
+    float code = floor(texel.r * 255.0 + 0.5) * 256.0 +
+                 floor(texel.a * 255.0 + 0.5);
+    vec4 color;
+    if (code < 0.5) {
+        color = bad_color;
+    } else {
+        float t = ((code - 1.0) / 65534.0 - vmin) / (vmax - vmin);
+        if (t < 0.0) {
+            color = under_color;
+        } else if (t > 1.0) {
+            color = over_color;
+        } else {
+            color = texture2D(lut, vec2((t * 255.0 + 0.5) / 256.0, 0.5));
+        }
+    }
+    gl_FragColor = color * frag_color;
+}
+'''
+
+
+def encode_scalars(data):
+    '''Quantize a 2D array to 16 bit codes over its finite range. Return the
+       codes as a (rows, cols, 2) uint8 array (high byte, low byte) and the
+       (min, max) range. Invalid and masked values are coded as 0, valid
+       values from 1 to 65535.
+    '''
+    data = np.ma.asarray(data)
+    values = np.asarray(data.filled(np.nan), dtype=float)
+    valid = np.isfinite(values)
+    if valid.any():
+        dmin, dmax = values[valid].min(), values[valid].max()
+    else:
+        dmin, dmax = 0.0, 1.0
+    span = (dmax - dmin) or 1.0
+    codes = np.zeros(values.shape, dtype=np.uint16)
+    codes[valid] = 1 + np.round((values[valid] - dmin) / span *
+                                65534).astype(np.uint16)
+    packed = np.empty(values.shape + (2,), dtype=np.uint8)
+    packed[..., 0] = codes >> 8
+    packed[..., 1] = codes & 0xff
+    return packed, (dmin, dmin + span)
+
+
+def colormap_lut(cmap):
+    '''Return the 256 RGBA entries of cmap as uint8 and the under, over and
+       bad colors as floats.
+    '''
+    lut = cmap(np.linspace(0, 1, 256), bytes=True)
+    under, over, bad = cmap(np.array([-1.0, 2.0, np.nan]))
+    return np.ascontiguousarray(lut), tuple(under), tuple(over), tuple(bad)
+
+
+class ScalarImage(AxesImage):
+    '''AxesImage drawn with a colormap shader by renderers providing
+       `draw_scalar_image` (see :class:`backend_kivy.RendererKivy`), and as a
+       regular AxesImage otherwise.
+    '''
+
+    def __init__(self, ax, **kwargs):
+        AxesImage.__init__(self, ax, **kwargs)
+        self.data_version = 0
+        self.uploads = 0
+        self._shader_state = None
+
+    def set_data(self, A):
+        AxesImage.set_data(self, A)
+        self.data_version += 1
+
+    def can_shade(self):
+        A = self.get_array()
+        ax = self.axes
+        return (A is not None and A.ndim == 2 and
+                type(self.norm) is Normalize and
+                ax.get_xscale() == 'linear' and ax.get_yscale() == 'linear')
+
+    def draw(self, renderer, *args, **kwargs):
+        if not hasattr(renderer, 'draw_scalar_image') or \
+                not self.can_shade():
+            return AxesImage.draw(self, renderer, *args, **kwargs)
+        if not self.get_visible():
+            return
+        if self.norm.vmin is None or self.norm.vmax is None:
+            self.autoscale_None()
+        gc = renderer.new_gc()
+        gc.set_alpha(self.get_alpha() if self.get_alpha() is not None
+                     else 1.0)
+        renderer.draw_scalar_image(gc, self)
+        gc.restore()
+        self.stale = False
+
+
+class ShaderImageState(object):
+    '''Kivy side of a :class:`ScalarImage`: the data and lookup textures and
+       the RenderContext with the colormap shader. Textures are only uploaded
+       again when the data or the colormap change.
+    '''
+
+    def __init__(self):
+        self.context = RenderContext(use_parent_projection=True,
+                                     use_parent_modelview=True)
+        self.context.shader.fs = FRAGMENT_SHADER
+        self.data_texture = None
+        self.lut_texture = None
+        self.data_version = None
+        self.lut_key = None
+        self.data_range = (0.0, 1.0)
+        with self.context:
+            self.lut_binding = BindTexture(index=1)
+            self.color = Color(1.0, 1.0, 1.0, 1.0)
+            self.rectangle = Rectangle()
+        self.context['lut'] = 1
+
+    def update(self, image):
+        '''Upload what changed since the previous draw and set the uniforms.
+        '''
+        if image.data_version != self.data_version:
+            packed, self.data_range = encode_scalars(image.get_array())
+            rows, cols = packed.shape[:2]
+            texture = self.data_texture
+            if texture is None or tuple(texture.size) != (cols, rows):
+                texture = Texture.create(size=(cols, rows),
+                                         colorfmt='luminance_alpha')
+                # Packed codes must not be interpolated.
+                texture.mag_filter = 'nearest'
+                texture.min_filter = 'nearest'
+                self.data_texture = texture
+            texture.blit_buffer(packed.tobytes(), colorfmt='luminance_alpha',
+                                bufferfmt='ubyte')
+            self.rectangle.texture = texture
+            self.data_version = image.data_version
+            image.uploads += 1
+        cmap = image.get_cmap()
+        lut, under, over, bad = colormap_lut(cmap)
+        lut_key = (lut.tobytes(), under, over, bad)
+        if lut_key != self.lut_key:
+            if self.lut_texture is None:
+                self.lut_texture = Texture.create(size=(256, 1))
+                self.lut_texture.mag_filter = 'nearest'
+                self.lut_texture.min_filter = 'nearest'
+            self.lut_texture.blit_buffer(lut.tobytes(), colorfmt='rgba',
+                                         bufferfmt='ubyte')
+            self.lut_binding.texture = self.lut_texture
+            self.lut_key = lut_key
+        dmin, dmax = self.data_range
+        span = dmax - dmin
+        self.context['vmin'] = float((image.norm.vmin - dmin) / span)
+        self.context['vmax'] = float((image.norm.vmax - dmin) / span)
+        self.context['under_color'] = [float(c) for c in under]
+        self.context['over_color'] = [float(c) for c in over]
+        self.context['bad_color'] = [float(c) for c in bad]
+
+
+def imshow_scalar(ax, data, cmap=None, norm=None, vmin=None, vmax=None,
+                  origin=None, extent=None, alpha=None, **kwargs):
+    '''Like `ax.imshow` for a 2D scalar array but returning a
+       :class:`ScalarImage` colormapped on the GPU by the kivy canvas.
+    '''
+    image = ScalarImage(ax, cmap=cmap, norm=norm, origin=origin,
+                        extent=extent, interpolation='nearest', **kwargs)
+    image.set_data(data)
+    image.set_alpha(alpha)
+    if norm is None:
+        image.set_clim(vmin, vmax)
+    image.autoscale_None()
+    ax.add_image(image)
+    xmin, xmax, ymin, ymax = image.get_extent()
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    return image
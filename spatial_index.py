@@ -0,0 +1,226 @@
+'''
+Spatial Index
+=====
+
+A uniform grid index over display-space points used by the kivy canvases to
+answer nearest-point and in-radius queries without walking every point of an
+artist. It is used by :meth:`FigureCanvasKivy.enable_spatial_index` to replace
+the linear `contains()` scan performed by matplotlib when picking.
+
+The index works on display coordinates (pixels), so it has to be rebuilt when
+either the data of the artist or its transform change. :class:`ArtistIndex`
+takes care of that lazily: the grid is only rebuilt on the first query after a
+change is detected.
+
+Example::
+
+    index = PointGridIndex(xy_pixels, cell_size=16)
+    ind = index.query_radius(120.0, 80.0, 5.0)
+    i, dist = index.nearest(120.0, 80.0)
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+
+class PointGridIndex(object):
+    '''Uniform grid over a set of 2D points. Points are bucketed into square
+       cells of `cell_size` pixels and stored sorted by cell, so a cell lookup
+       is a pair of `searchsorted` calls. Non finite points are ignored.
+    '''
+
+    def __init__(self, points, cell_size=16.0):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        finite = np.isfinite(points).all(axis=1)
+        self.ids = np.nonzero(finite)[0]
+        self.points = points[finite]
+        self.cell_size = float(cell_size)
+        if len(self.points):
+            self.origin = self.points.min(axis=0)
+            cells = np.floor((self.points - self.origin) /
+                             self.cell_size).astype(np.int64)
+            self.ncols = int(cells[:, 0].max()) + 1
+            self.nrows = int(cells[:, 1].max()) + 1
+        else:
+            self.origin = np.zeros(2)
+            cells = np.zeros((0, 2), dtype=np.int64)
+            self.ncols = self.nrows = 0
+        keys = cells[:, 1] * self.ncols + cells[:, 0]
+        order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[order]
+        self.ids = self.ids[order]
+        self.points = self.points[order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, x, y):
+        cx = int(np.floor((x - self.origin[0]) / self.cell_size))
+        cy = int(np.floor((y - self.origin[1]) / self.cell_size))
+        return cx, cy
+
+    def _candidates(self, cx0, cy0, cx1, cy1):
+        '''Return the positions (in the sorted arrays) of the points stored in
+           the cells of the inclusive range [cx0, cx1] x [cy0, cy1].
+        '''
+        cx0 = max(cx0, 0)
+        cy0 = max(cy0, 0)
+        cx1 = min(cx1, self.ncols - 1)
+        cy1 = min(cy1, self.nrows - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return np.zeros(0, dtype=np.intp)
+        rows = np.arange(cy0, cy1 + 1, dtype=np.int64) * self.ncols
+        starts = np.searchsorted(self.keys, rows + cx0, side='left')
+        stops = np.searchsorted(self.keys, rows + cx1, side='right')
+        spans = [np.arange(a, b) for a, b in zip(starts, stops) if b > a]
+        if not spans:
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate(spans)
+
+    def query_radius(self, x, y, radius):
+        '''Return the indices of the original points that are within `radius`
+           pixels of (x, y), sorted by distance.
+        '''
+        if not len(self.points):
+            return np.zeros(0, dtype=np.intp)
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        pos = self._candidates(cx0, cy0, cx1, cy1)
+        if not len(pos):
+            return np.zeros(0, dtype=np.intp)
+        d2 = ((self.points[pos] - (x, y)) ** 2).sum(axis=1)
+        inside = d2 <= radius * radius
+        pos = pos[inside]
+        return self.ids[pos[np.argsort(d2[inside], kind='mergesort')]]
+
+    def nearest(self, x, y, max_distance=np.inf):
+        '''Return a tuple (index, distance) with the original index of the
+           point closest to (x, y). If there is no point within
+           `max_distance` pixels, (None, inf) is returned.
+        '''
+        if not len(self.points):
+            return None, np.inf
+        cx, cy = self._cell(x, y)
+        # Distance from (x, y) to the grid, used to know when to stop growing
+        # the ring of visited cells.
+        gx = min(max(cx, 0), self.ncols - 1)
+        gy = min(max(cy, 0), self.nrows - 1)
+        ring = max(abs(cx - gx), abs(cy - gy))
+        max_ring = max(self.ncols, self.nrows) + ring
+        best, best_d2 = None, np.inf
+        visited = 0
+        while ring <= max_ring:
+            if ring == 0:
+                pos = self._candidates(cx, cy, cx, cy)
+            else:
+                parts = [
+                    self._candidates(cx - ring, cy - ring,
+                                     cx + ring, cy - ring),
+                    self._candidates(cx - ring, cy + ring,
+                                     cx + ring, cy + ring),
+                    self._candidates(cx - ring, cy - ring + 1,
+                                     cx - ring, cy + ring - 1),
+                    self._candidates(cx + ring, cy - ring + 1,
+                                     cx + ring, cy + ring - 1)]
+                pos = np.concatenate(parts)
+            if len(pos):
+                visited += len(pos)
+                d2 = ((self.points[pos] - (x, y)) ** 2).sum(axis=1)
+                i = int(np.argmin(d2))
+                if d2[i] < best_d2:
+                    best, best_d2 = pos[i], d2[i]
+            # Every point outside the visited rings is at least this far.
+            reach = ring * self.cell_size
+            if best is not None and reach * reach >= best_d2:
+                break
+            if reach > max_distance or visited == len(self.points):
+                break
+            ring += 1
+        if best is None or best_d2 > max_distance * max_distance:
+            return None, np.inf
+        return int(self.ids[best]), float(np.sqrt(best_d2))
+
+
+def _artist_display_points(artist):
+    '''Return the display coordinates of the points of a Line2D or of the
+       offsets of a Collection (e.g. the result of a scatter call).
+    '''
+    if hasattr(artist, 'get_xydata'):
+        xy = artist.get_xydata()
+        return artist.get_transform().transform(xy)
+    offsets = artist.get_offsets()
+    if hasattr(artist, 'get_offset_transform'):
+        trans = artist.get_offset_transform()
+    else:
+        trans = artist._transOffset
+    return trans.transform(offsets)
+
+
+def _artist_data(artist):
+    if hasattr(artist, 'get_xydata'):
+        return artist.get_xydata()
+    return artist.get_offsets()
+
+
+class ArtistIndex(object):
+    '''Lazily rebuilt :class:`PointGridIndex` for a single artist. The grid is
+       rebuilt when the data of the artist, its transform or the size of the
+       axes it belongs to change.
+    '''
+
+    def __init__(self, artist, cell_size=16.0):
+        self.artist = artist
+        self.cell_size = cell_size
+        self.builds = 0
+        self._key = None
+        self._index = None
+
+    def invalidate(self):
+        self._key = None
+
+    def _data_key(self):
+        data = _artist_data(self.artist)
+        data = np.asarray(data)
+        n = len(data)
+        # A few samples catch in place modifications of the same array.
+        sample = data[::max(n // 8, 1)].tobytes() if n else b''
+        return (id(data), data.shape, sample)
+
+    def _transform_key(self):
+        ax = self.artist.axes
+        if ax is None:
+            trans = self.artist.get_transform()
+            return tuple(trans.get_affine().get_matrix().ravel())
+        return (tuple(ax.viewLim.bounds), tuple(ax.bbox.bounds),
+                ax.get_xscale(), ax.get_yscale())
+
+    @property
+    def index(self):
+        key = (self._data_key(), self._transform_key())
+        if key != self._key or self._index is None:
+            self._index = PointGridIndex(_artist_display_points(self.artist),
+                                         self.cell_size)
+            self._key = key
+            self.builds += 1
+        return self._index
+
+    def query_radius(self, x, y, radius):
+        return self.index.query_radius(x, y, radius)
+
+    def nearest(self, x, y, max_distance=np.inf):
+        return self.index.nearest(x, y, max_distance)
+
+    def picker(self, radius):
+        '''Return a callable following matplotlib picker protocol which uses
+           the index instead of `artist.contains`.
+        '''
+        def pick(artist, mouseevent):
+            if mouseevent.x is None or mouseevent.y is None:
+                return False, {}
+            ind = self.query_radius(mouseevent.x, mouseevent.y, radius)
+            if not len(ind):
+                return False, {}
+            return True, dict(ind=ind)
+        return pick
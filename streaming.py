@@ -0,0 +1,171 @@
+'''
+Streaming
+=====
+
+Fixed capacity ring buffers and streamed lines for telemetry style plots on
+the kivy canvases. A :class:`StreamTrace` is created with
+:meth:`FigureCanvasKivy.add_stream` and receives samples with
+:meth:`StreamTrace.append` or :meth:`StreamTrace.extend`. The canvas flushes
+the traces once per frame: when the axis limits did not change only the new
+segments are drawn on top of the current render and blitted, otherwise the
+figure is redrawn.
+
+Example::
+
+    trace = canvas.add_stream(ax, capacity=10000, autoscroll=10.0,
+                              color='r')
+    trace.extend(t, values)
+    canvas.stream_stats['samples_per_second']
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from timeit import default_timer
+
+import numpy as np
+from matplotlib.lines import Line2D
+
+
+class RingBuffer(object):
+    '''Fixed capacity buffer of the last `capacity` rows appended. The data is
+       written twice in a buffer of twice the capacity so the content is
+       always available as a contiguous view, in order, without copying.
+       Appends are O(1) amortized per sample.
+    '''
+
+    def __init__(self, capacity, width=1, dtype=float):
+        self.capacity = int(capacity)
+        self._data = np.zeros((2 * self.capacity, width), dtype=dtype)
+        self._start = 0
+        self._size = 0
+        self.total = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dropped(self):
+        '''Number of rows that were pushed out of the buffer.'''
+        return self.total - self._size
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=self._data.dtype)
+        rows = rows.reshape(len(rows), self._data.shape[1])
+        n = len(rows)
+        self.total += n
+        if n >= self.capacity:
+            rows = rows[-self.capacity:]
+            n = self.capacity
+            self._start = 0
+            self._size = 0
+        cap = self.capacity
+        end = (self._start + self._size) % cap
+        first = min(n, cap - end)
+        for offset in (0, cap):
+            self._data[end + offset:end + offset + first] = rows[:first]
+            self._data[offset:offset + n - first] = rows[first:]
+        overflow = max(self._size + n - cap, 0)
+        self._start = (self._start + overflow) % cap
+        self._size = min(self._size + n, cap)
+
+    def append(self, row):
+        self.extend(np.asarray(row, dtype=self._data.dtype).reshape(1, -1))
+
+    def view(self, last=None):
+        '''Return a read only view of the content, oldest row first. If
+           `last` is given only the last rows are returned.
+        '''
+        size = self._size if last is None else min(last, self._size)
+        stop = self._start + self._size
+        view = self._data[stop - size:stop]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+
+class StreamTrace(object):
+    '''Line of an axes backed by a :class:`RingBuffer` of (x, y) samples.
+       `autoscroll` is the width of the x window shown; when set, the x
+       limits follow the last sample. They jump by `scroll_step` times the
+       window width when the last sample leaves the window so the samples
+       in between can be drawn incrementally.
+    '''
+
+    scroll_step = 0.25
+
+    def __init__(self, ax, capacity, autoscroll=None, **line_kwargs):
+        self.ax = ax
+        self.buffer = RingBuffer(capacity, width=2)
+        self.autoscroll = autoscroll
+        self.line = Line2D([], [], **line_kwargs)
+        ax.add_line(self.line)
+        # Samples not drawn yet, the last drawn sample is kept to connect
+        # the new segment.
+        self._pending = 0
+        self._drawn_dropped = 0
+        self.samples = 0
+        self._started = None
+
+    def append(self, x, y):
+        self.extend([x], [y])
+
+    def extend(self, x, y):
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        self.buffer.extend(np.column_stack((x, y)))
+        if self._started is None:
+            self._started = default_timer()
+        self._pending += len(x)
+        self.samples += len(x)
+
+    @property
+    def samples_per_second(self):
+        if self._started is None:
+            return 0.0
+        elapsed = default_timer() - self._started
+        return self.samples / elapsed if elapsed > 0 else 0.0
+
+    def _update_line(self):
+        data = self.buffer.view()
+        self.line.set_data(data[:, 0], data[:, 1])
+
+    def _scroll(self):
+        '''Move the x limits to show the last sample. Return True if the
+           limits changed.
+        '''
+        if self.autoscroll is None or not len(self.buffer):
+            return False
+        last = self.buffer.view(1)[0, 0]
+        x0, x1 = self.ax.get_xlim()
+        if x0 <= last <= x1 and np.isclose(x1 - x0, self.autoscroll):
+            return False
+        x1 = last + self.autoscroll * self.scroll_step
+        self.ax.set_xlim(x1 - self.autoscroll, x1)
+        return True
+
+    def _segment(self):
+        '''Return a Line2D with the samples not drawn yet, connected to the
+           last drawn sample, styled as the line of the trace.
+        '''
+        data = self.buffer.view(self._pending + 1)
+        segment = Line2D(data[:, 0], data[:, 1])
+        segment.update_from(self.line)
+        segment.set_transform(self.line.get_transform())
+        segment.set_clip_box(self.line.clipbox)
+        segment.set_clip_path(self.line.get_clip_path())
+        segment.axes = self.ax
+        segment.set_figure(self.ax.figure)
+        return segment
+
+    def _needs_redraw(self):
+        # Samples that left the buffer while the limits did not move are
+        # still painted, only a redraw removes them.
+        return self.buffer.dropped != self._drawn_dropped
+
+    def _drawn(self):
+        self._pending = 0
+        self._drawn_dropped = self.buffer.dropped
@@ -0,0 +1,163 @@
+'''
+Texture Budget
+=====
+
+Process wide accounting of the GPU textures allocated by the canvases. Every
+texture a canvas creates is registered in :data:`backend_kivy.texture_budget`
+with its size in bytes and its purpose:
+
+    `figure`
+        The texture holding the render of an agg canvas.
+    `image`
+        Images drawn by the vector renderer (`imshow`, tiles, scalar
+        images).
+    `text`
+        Text and math text labels.
+    `cache`
+        Off-screen copies of a render, e.g. for `copy_from_bbox`.
+
+When `max_bytes` is set and a render takes the total over it, the textures
+of the other canvases not visible in the window are evicted, least recently
+drawn first. An evicted canvas drops its graphics instructions and is
+rendered again when it is next shown. Visible canvases are kept, when they
+alone exceed the budget it is counted in `stats['over_budget']`. The usage per
+canvas and per purpose is returned by :meth:`TextureBudget.report`::
+
+    from kivy.garden.matplotlib.backend_kivy import texture_budget
+    texture_budget.max_bytes = 64 << 20
+    print(texture_budget.report()['total'])
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import weakref
+from collections import OrderedDict
+
+PURPOSES = ('figure', 'image', 'text', 'cache')
+
+_bytes_per_pixel = {'rgba': 4, 'bgra': 4, 'rgb': 3, 'bgr': 3,
+                    'luminance_alpha': 2, 'luminance': 1, 'alpha': 1,
+                    'red': 1, 'rg': 2}
+
+
+def texture_nbytes(texture):
+    '''Return the size in bytes of a kivy texture, regions included.'''
+    w, h = texture.size
+    return int(w) * int(h) * _bytes_per_pixel.get(texture.colorfmt, 4)
+
+
+class TextureBudget(object):
+    '''Registry of the texture bytes per canvas and per purpose. Canvases
+       are held by weak references and must provide `is_visible_in_window()`
+       and `evict_textures()`. `max_bytes` is the budget, None for no limit.
+    '''
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        # Least recently drawn canvas first.
+        self._canvases = OrderedDict()
+        self.stats = {'evictions': 0, 'evicted_bytes': 0, 'peak_bytes': 0,
+                      'over_budget': 0}
+
+    def _usage(self, canvas):
+        usage = self._canvases.get(weakref.ref(canvas))
+        if usage is None:
+            usage = dict.fromkeys(PURPOSES, 0)
+            self._canvases[weakref.ref(canvas, self._forget)] = usage
+        return usage
+
+    def _forget(self, ref):
+        self._canvases.pop(ref, None)
+
+    def add(self, canvas, purpose, texture):
+        '''Account for a new texture of canvas.'''
+        self._usage(canvas)[purpose] += texture_nbytes(texture)
+        self.stats['peak_bytes'] = max(self.stats['peak_bytes'],
+                                       self.total())
+
+    def set(self, canvas, purpose, texture):
+        '''Account for the only texture of canvas for purpose, or for none
+           if texture is None.
+        '''
+        self._usage(canvas)[purpose] = \
+            texture_nbytes(texture) if texture is not None else 0
+        self.stats['peak_bytes'] = max(self.stats['peak_bytes'],
+                                       self.total())
+
+    def reset(self, canvas, purposes=PURPOSES):
+        '''Forget the textures of canvas for purposes, e.g. at the start of a
+           render that replaces them.
+        '''
+        usage = self._usage(canvas)
+        for purpose in purposes:
+            usage[purpose] = 0
+
+    def nbytes(self, canvas=None, purpose=None):
+        '''Bytes used by canvas (all if None) for purpose (all if None).'''
+        if canvas is not None:
+            usages = [self._usage(canvas)]
+        else:
+            usages = self._canvases.values()
+        purposes = PURPOSES if purpose is None else (purpose,)
+        return sum(usage[p] for usage in usages for p in purposes)
+
+    def total(self):
+        return self.nbytes()
+
+    def drawn(self, canvas):
+        '''Mark canvas as the most recently drawn and enforce the budget,
+           canvas itself being kept.
+        '''
+        usage = self._canvases.pop(weakref.ref(canvas), None) or \
+            dict.fromkeys(PURPOSES, 0)
+        self._canvases[weakref.ref(canvas, self._forget)] = usage
+        self.enforce(keep=canvas)
+
+    def enforce(self, keep=None):
+        '''Evict the canvases not visible in the window, least recently drawn
+           first, until the total is within the budget. Visible canvases are
+           never evicted, they would be rendered again at once; when they
+           alone exceed the budget `over_budget` is counted instead. Return
+           the number of canvases evicted.
+        '''
+        if self.max_bytes is None or self.total() <= self.max_bytes:
+            return 0
+        canvases = [ref() for ref in self._canvases]
+        evicted = 0
+        for canvas in canvases:
+            if self.total() <= self.max_bytes:
+                break
+            if canvas is None or canvas is keep or \
+                    canvas.is_visible_in_window():
+                continue
+            nbytes = self.nbytes(canvas)
+            if not nbytes:
+                continue
+            canvas.evict_textures()
+            self.reset(canvas)
+            self.stats['evictions'] += 1
+            self.stats['evicted_bytes'] += nbytes
+            evicted += 1
+        if self.total() > self.max_bytes:
+            self.stats['over_budget'] += 1
+        return evicted
+
+    def report(self):
+        '''Return the usage as a dict with the `total`, the `max_bytes`, the
+           bytes per purpose and one entry per canvas, least recently drawn
+           first, with its bytes per purpose and its visibility.
+        '''
+        canvases = []
+        for ref, usage in self._canvases.items():
+            canvas = ref()
+            if canvas is None:
+                continue
+            canvases.append({'canvas': canvas,
+                             'visible': canvas.is_visible_in_window(),
+                             'bytes': dict(usage),
+                             'total': sum(usage.values())})
+        return {'total': self.total(), 'max_bytes': self.max_bytes,
+                'purposes': dict((p, self.nbytes(purpose=p))
+                                 for p in PURPOSES),
+                'canvases': canvases, 'stats': dict(self.stats)}
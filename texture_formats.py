@@ -0,0 +1,100 @@
+'''
+Texture Formats
+=====
+
+Pixel formats of the texture an agg canvas uploads its render to, selected
+with `FigureCanvasKivyAgg.texture_format`:
+
+    `rgba`
+        8 bits per channel, 4 bytes per pixel. The default.
+    `rgb`
+        8 bits per channel without alpha, 3 bytes per pixel.
+    `rgb565`
+        5 bits of red, 6 of green and 5 of blue packed in 2 bytes per pixel.
+        Kivy has no packed 16 bit texture format, so the pixels are uploaded
+        as a `luminance_alpha` texture (high byte, low byte) decoded by a
+        fragment shader, with nearest filtering since packed values must not
+        be interpolated.
+
+The reduced formats drop the alpha channel, so they are only used when the
+render is opaque, i.e. when the figure background is visible and opaque.
+Otherwise the canvas falls back to `rgba`. The conversions are vectorized
+with numpy and do not depend on kivy::
+
+    canvas.texture_format = 'rgb565'
+    canvas.draw()
+    print(canvas.draw_stats['uploaded_bytes'])
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+# Kivy color format of the texture and bytes per pixel of each format.
+TEXTURE_FORMATS = {'rgba': ('rgba', 4), 'rgb': ('rgb', 3),
+                   'rgb565': ('luminance_alpha', 2)}
+
+RGB565_SHADER = '''
+$HEADER$
+
+void main(void) {
+    vec4 texel = texture2D(texture0, tex_coord0);
+    float high = floor(texel.r * 255.0 + 0.5);
+    float low = floor(texel.a * 255.0 + 0.5);
+    vec3 rgb = vec3(floor(high / 8.0),
+                    mod(high, 8.0) * 8.0 + floor(low / 32.0),
+                    mod(low, 32.0)) / vec3(31.0, 63.0, 31.0);
+    gl_FragColor = vec4(rgb, 1.0) * frag_color;
+}
+'''
+
+
+def is_opaque(figure):
+    '''Return whether every pixel of a render of figure is opaque.'''
+    patch = figure.patch
+    return patch.get_visible() and patch.get_facecolor()[3] >= 1.0
+
+
+def upload_format(texture_format, figure):
+    '''Return the format to upload a render of figure with, `rgba` if
+       texture_format needs an opaque render and figure is not.
+    '''
+    if texture_format not in TEXTURE_FORMATS:
+        raise ValueError('Unknown texture format %r, expected one of %s' %
+                         (texture_format, ', '.join(sorted(TEXTURE_FORMATS))))
+    if texture_format != 'rgba' and not is_opaque(figure):
+        return 'rgba'
+    return texture_format
+
+
+_levels = np.arange(256, dtype=np.uint16)
+# Big endian RGB565 bits of each 8 bit level of the red, green and blue.
+_RGB565 = (((_levels * 31 + 127) // 255) << 11,
+           ((_levels * 63 + 127) // 255) << 5,
+           (_levels * 31 + 127) // 255)
+_RGB565 = tuple(bits.astype('>u2') for bits in _RGB565)
+
+
+def pack_rgb565(rgba):
+    '''Return the (h, w, 2) uint8 high and low bytes of the RGB565 codes of
+       the (h, w, 4) uint8 pixels rgba, rounded to the nearest level.
+    '''
+    red, green, blue = _RGB565
+    code = red[rgba[..., 0]]
+    code |= green[rgba[..., 1]]
+    code |= blue[rgba[..., 2]]
+    return code.view(np.uint8).reshape(rgba.shape[:2] + (2,))
+
+
+def convert(rgba, texture_format):
+    '''Return the bytes of the (h, w, 4) uint8 pixels rgba in
+       texture_format.
+    '''
+    if texture_format == 'rgba':
+        return np.ascontiguousarray(rgba).tobytes()
+    if texture_format == 'rgb':
+        return np.ascontiguousarray(rgba[..., :3]).tobytes()
+    if texture_format == 'rgb565':
+        return pack_rgb565(rgba).tobytes()
+    raise ValueError('Unknown texture format %r' % (texture_format, ))
@@ -0,0 +1,159 @@
+'''
+Thumbnails
+=====
+
+Command line batch rendering of saved figures, e.g. the previews of a
+gallery. The inputs are pickled figures (`.pickle`, `.pkl`) and plotting
+scripts (`.py`, every figure left open by the script is rendered). Each
+figure is rendered with agg at every requested size and dpi, across a pool
+of processes. Kivy is not imported, no window is created::
+
+    python thumbnails.py figures/ -o previews/ --size 320x240 --size 64x48 \\
+        --dpi 72 --jobs 8
+
+A size is in pixels, the figure is resized to it at the dpi of the render.
+Without `--size` the figures keep their size. The files are named after the
+input, the index of the figure for scripts opening several, the size and the
+dpi, e.g. `sales-1_320x240_72dpi.png`. The time of each input and the total
+throughput are printed.
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer
+
+INPUT_EXTENSIONS = ('.pickle', '.pkl', '.py')
+
+
+def parse_size(text):
+    '''Parse a `WIDTHxHEIGHT` size in pixels.'''
+    try:
+        w, h = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected WIDTHxHEIGHT, got %r' %
+                                         text)
+    if w <= 0 or h <= 0:
+        raise argparse.ArgumentTypeError('size must be positive: %r' % text)
+    return w, h
+
+
+def find_inputs(paths):
+    '''Return the sorted input files of paths, files or directories.'''
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in os.listdir(path):
+                if os.path.splitext(name)[1].lower() in INPUT_EXTENSIONS:
+                    inputs.append(os.path.join(path, name))
+        else:
+            inputs.append(path)
+    return sorted(inputs)
+
+
+def load_figures(path):
+    '''Return the figures of a pickle or of a plotting script.'''
+    import matplotlib.pyplot as plt
+    if os.path.splitext(path)[1].lower() == '.py':
+        import runpy
+        plt.close('all')
+        runpy.run_path(path, run_name='__main__')
+        figures = [plt.figure(num) for num in plt.get_fignums()]
+        return figures
+    with open(path, 'rb') as stream:
+        figure = pickle.load(stream)
+    return figure if isinstance(figure, list) else [figure]
+
+
+def render_input(path, outdir, sizes, dpis, fmt):
+    '''Render the figures of path to outdir in a worker. Return the path,
+       the files written, the seconds spent and the error message if any.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from export import render_rgba, write_image
+    start = default_timer()
+    written = []
+    try:
+        figures = load_figures(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for index, figure in enumerate(figures):
+            name = stem if len(figures) == 1 else '%s-%d' % (stem, index)
+            inches = tuple(figure.get_size_inches())
+            for dpi in dpis or [figure.dpi]:
+                figure.set_dpi(dpi)
+                for size in sizes or [None]:
+                    if size is None:
+                        figure.set_size_inches(inches, forward=False)
+                        w, h = (int(round(v * dpi)) for v in inches)
+                    else:
+                        w, h = size
+                        figure.set_size_inches(w / dpi, h / dpi,
+                                               forward=False)
+                    filename = os.path.join(outdir, '%s_%dx%d_%ddpi.%s' % (
+                        name, w, h, dpi, fmt))
+                    write_image(filename, render_rgba(figure), fmt, dpi=dpi)
+                    written.append(filename)
+        plt.close('all')
+    except Exception as error:
+        return path, written, default_timer() - start, \
+            '%s: %s' % (type(error).__name__, error)
+    return path, written, default_timer() - start, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render thumbnails of pickled figures and plotting '
+                    'scripts.')
+    parser.add_argument('inputs', nargs='+',
+                        help='pickled figures, scripts or directories')
+    parser.add_argument('-o', '--output', default='.',
+                        help='output directory (default: %(default)s)')
+    parser.add_argument('-s', '--size', type=parse_size, action='append',
+                        default=[], help='WIDTHxHEIGHT in pixels, repeatable')
+    parser.add_argument('-d', '--dpi', type=float, action='append',
+                        default=[], help='dpi of the renders, repeatable')
+    parser.add_argument('-f', '--format', default='png',
+                        help='png, jpg, tif, raw... (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error('no input found')
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    start = default_timer()
+    images = failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(render_input, path, args.output,
+                                   args.size, args.dpi, args.format.lower())
+                   for path in inputs]
+        for future in futures:
+            path, written, elapsed, error = future.result()
+            images += len(written)
+            if error is None:
+                print('%s: %d images in %.1f ms' % (path, len(written),
+                                                    elapsed * 1000))
+            else:
+                failures += 1
+                print('%s: failed after %.1f ms, %s' % (path, elapsed * 1000,
+                                                       error),
+                      file=sys.stderr)
+    total = default_timer() - start
+    print('%d inputs, %d images, %d failed in %.2f s: %.1f inputs/s, '
+          '%.1f images/s' % (len(inputs), images, failures, total,
+                             len(inputs) / total, images / total))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
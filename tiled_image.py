@@ -0,0 +1,365 @@
+'''
+Tiled Image
+=====
+
+Display of images too large for a single texture, e.g. gigapixel microscopy
+scans or maps, possibly memory mapped. :class:`TiledImage` cuts the source
+into tiles of `tile_size` pixels and builds lazily a multi-resolution pyramid:
+a tile of level `n` covers `tile_size * 2 ** n` source pixels decimated by
+`2 ** n`. On every draw only the tiles intersecting the view are used, at the
+level matching the zoom. Missing tiles are computed on a background thread,
+meanwhile a coarser tile already in memory is drawn in place.
+
+Tiles are kept in a cache of bounded size with least recently used eviction.
+With :class:`backend_kivy.RendererKivy` tiles are uploaded once to textures,
+with agg they are resampled to the screen.
+
+Example::
+
+    scan = np.load('scan.npy', mmap_mode='r')
+    image = canvas.add_tiled_image(ax, scan, cmap='gray', max_bytes=256 << 20)
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from six.moves import queue
+from matplotlib.artist import Artist
+from matplotlib import cm
+from matplotlib.colors import Normalize
+
+
+class TileCache(object):
+    '''Thread safe least recently used mapping holding at most `max_bytes`
+       bytes of arrays.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._items[key] = value
+            self.nbytes += value.nbytes
+            while len(self._items) > 1 and self.nbytes > self.max_bytes:
+                self.nbytes -= self._items.popitem(last=False)[1].nbytes
+                self.evictions += 1
+
+
+class ImagePyramid(object):
+    '''Lazy multi-resolution view of a (rows, cols), (rows, cols, 3) or
+       (rows, cols, 4) array. Scalar data is colormapped with `cmap` and
+       `norm` when the tiles are computed.
+    '''
+
+    def __init__(self, source, tile_size=256, cmap=None, norm=None):
+        self.source = source
+        self.tile_size = int(tile_size)
+        self.rows, self.cols = source.shape[:2]
+        self.scalar = source.ndim == 2
+        if norm is None and self.scalar:
+            # Estimated on a decimated copy so the whole source is not read.
+            step = max(max(self.rows, self.cols) // 1024, 1)
+            sample = np.asarray(source[::step, ::step], dtype=float)
+            norm = Normalize(np.nanmin(sample), np.nanmax(sample))
+        self.mappable = cm.ScalarMappable(norm=norm, cmap=cmap)
+        levels = 1
+        while max(self.rows, self.cols) > self.tile_size * 2 ** (levels - 1):
+            levels += 1
+        self.levels = levels
+
+    def tile_span(self, level):
+        '''Number of source pixels covered by a tile of the level.'''
+        return self.tile_size * 2 ** level
+
+    def tile_grid(self, level):
+        span = self.tile_span(level)
+        return -(-self.rows // span), -(-self.cols // span)
+
+    def tile(self, level, i, j):
+        '''Return the RGBA uint8 tile of row i and column j of the level,
+           first row on top. Border tiles are smaller.
+        '''
+        step = 2 ** level
+        span = self.tile_span(level)
+        data = self.source[i * span:(i + 1) * span:step,
+                           j * span:(j + 1) * span:step]
+        data = np.asarray(data)
+        if self.scalar:
+            return self.mappable.to_rgba(data, bytes=True)
+        if data.dtype != np.uint8:
+            data = (np.clip(data, 0, 1) * 255).astype(np.uint8)
+        if data.shape[2] == 3:
+            alpha = np.full(data.shape[:2] + (1,), 255, dtype=np.uint8)
+            data = np.concatenate((data, alpha), axis=2)
+        return np.ascontiguousarray(data)
+
+
+class TileLoader(object):
+    '''Background thread computing the tiles requested by :class:`TiledImage`.
+       The most recent requests are served first. `on_loaded` is called from
+       the loader thread after each tile is stored in the cache. The thread
+       is a daemon, it runs until :meth:`stop` is called.
+    '''
+
+    def __init__(self, pyramid, cache, on_loaded=None):
+        self.pyramid = pyramid
+        self.cache = cache
+        self.on_loaded = on_loaded
+        self.loaded = 0
+        self._queue = queue.LifoQueue()
+        self._requested = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, key):
+        with self._lock:
+            if key in self._requested:
+                return
+            self._requested.add(key)
+        self._queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            if key is None:
+                return
+            try:
+                if key not in self.cache:
+                    self.cache.put(key, self.pyramid.tile(*key))
+                    self.loaded += 1
+            finally:
+                with self._lock:
+                    self._requested.discard(key)
+            if self.on_loaded is not None:
+                self.on_loaded(key)
+
+    def stop(self):
+        self._queue.put(None)
+
+
+def _weak_callback(method):
+    '''Return a function calling the bound method without keeping its
+       object alive.
+    '''
+    ref = weakref.WeakMethod(method)
+
+    def callback(*args):
+        method = ref()
+        if method is not None:
+            method(*args)
+    return callback
+
+
+class TiledImage(Artist):
+    '''Artist drawing a large image from an :class:`ImagePyramid`. The image
+       covers `extent` (left, right, bottom, top) in data coordinates, by
+       default the pixel coordinates of the source with `origin` 'upper' as
+       in `imshow`. `max_bytes` bounds the memory used by the tiles.
+       `on_tile_loaded` is called from the loader thread when a missing tile
+       is ready; it has to schedule a redraw on the main thread.
+    '''
+
+    zorder = 0
+
+    def __init__(self, source, extent=None, origin='upper', tile_size=256,
+                 cmap=None, norm=None, max_bytes=128 << 20,
+                 on_tile_loaded=None):
+        Artist.__init__(self)
+        self.pyramid = ImagePyramid(source, tile_size, cmap=cmap, norm=norm)
+        if extent is None:
+            extent = (-0.5, self.pyramid.cols - 0.5,
+                      self.pyramid.rows - 0.5, -0.5)
+            if origin == 'lower':
+                extent = extent[:2] + extent[2:][::-1]
+        self.extent = extent
+        self.origin = origin
+        self.cache = TileCache(max_bytes)
+        self.on_tile_loaded = on_tile_loaded
+        # The loader only references the image weakly, the thread is stopped
+        # when the image is removed or collected with its figure.
+        self.loader = TileLoader(self.pyramid, self.cache,
+                                 _weak_callback(self._tile_loaded))
+        self._stop_loader = weakref.finalize(self, self.loader.stop)
+        self._textures = OrderedDict()
+        self.stats = {'drawn': 0, 'missing': 0, 'fallback': 0, 'level': 0}
+
+    def _tile_loaded(self, key):
+        if self.on_tile_loaded is not None:
+            self.on_tile_loaded(key)
+
+    def _source_to_data(self, col, row):
+        left, right, bottom, top = self.extent
+        if self.origin == 'upper':
+            bottom, top = top, bottom
+        x = left + (right - left) * col / self.pyramid.cols
+        y = bottom + (top - bottom) * row / self.pyramid.rows
+        return x, y
+
+    def _visible_source_rect(self):
+        '''Return the visible part of the source as (col0, col1, row0, row1)
+           and the number of source pixels per screen pixel.
+        '''
+        ax = self.axes
+        (vx0, vy0), (vx1, vy1) = ax.viewLim.get_points()
+        left, right, bottom, top = self.extent
+        if self.origin == 'upper':
+            bottom, top = top, bottom
+        cols, rows = self.pyramid.cols, self.pyramid.rows
+        c = sorted(((vx0 - left) / (right - left) * cols,
+                    (vx1 - left) / (right - left) * cols))
+        r = sorted(((vy0 - bottom) / (top - bottom) * rows,
+                    (vy1 - bottom) / (top - bottom) * rows))
+        density = max((c[1] - c[0]) / max(ax.bbox.width, 1),
+                      (r[1] - r[0]) / max(ax.bbox.height, 1))
+        c0, c1 = max(int(np.floor(c[0])), 0), min(int(np.ceil(c[1])), cols)
+        r0, r1 = max(int(np.floor(r[0])), 0), min(int(np.ceil(r[1])), rows)
+        return (c0, c1, r0, r1), density
+
+    def _level_for(self, density):
+        if density <= 1:
+            return 0
+        return min(int(np.floor(np.log2(density))), self.pyramid.levels - 1)
+
+    def _tiles_for(self, level, rect):
+        c0, c1, r0, r1 = rect
+        span = self.pyramid.tile_span(level)
+        for i in range(r0 // span, (max(r1, r0 + 1) - 1) // span + 1):
+            for j in range(c0 // span, (max(c1, c0 + 1) - 1) // span + 1):
+                yield (level, i, j)
+
+    def _fallback(self, key):
+        '''Return the key of the first coarser tile in cache covering the
+           tile, or None.
+        '''
+        level, i, j = key
+        while level < self.pyramid.levels - 1:
+            level, i, j = level + 1, i // 2, j // 2
+            if (level, i, j) in self.cache:
+                return (level, i, j)
+        return None
+
+    def draw(self, renderer):
+        if not self.get_visible() or self.axes is None:
+            return
+        rect, density = self._visible_source_rect()
+        if rect[1] <= rect[0] or rect[3] <= rect[2]:
+            return
+        level = self._level_for(density)
+        self.stats['level'] = level
+        ready, fallbacks = [], []
+        for key in self._tiles_for(level, rect):
+            rgba = self.cache.get(key)
+            if rgba is None:
+                self.loader.request(key)
+                self.stats['missing'] += 1
+                parent = self._fallback(key)
+                if parent is not None and parent not in fallbacks:
+                    fallbacks.append(parent)
+            else:
+                ready.append((key, rgba))
+        for parent in fallbacks:
+            rgba = self.cache.get(parent)
+            if rgba is not None:
+                ready.insert(0, (parent, rgba))
+                self.stats['fallback'] += 1
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(self.axes.bbox)
+        for key, rgba in ready:
+            self._draw_tile(renderer, gc, key, rgba)
+        gc.restore()
+        self.stats['drawn'] += len(ready)
+        self.stale = False
+
+    def _draw_tile(self, renderer, gc, key, rgba):
+        level, i, j = key
+        span = self.pyramid.tile_span(level)
+        th, tw = rgba.shape[:2]
+        trans = self.axes.transData
+        # Corners of the tile on the screen, the first row of the tile is on
+        # top with origin 'upper'.
+        (x0, y0), (x1, y1) = trans.transform(
+            [self._source_to_data(j * span, i * span),
+             self._source_to_data(j * span + tw * 2 ** level,
+                                  i * span + th * 2 ** level)])
+        flip_x, flip_y = x1 < x0, y1 > y0
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        cx0, cy0, cx1, cy1 = self.axes.bbox.extents
+        vx0, vy0 = max(x0, cx0), max(y0, cy0)
+        vx1, vy1 = min(x1, cx1), min(y1, cy1)
+        if vx1 <= vx0 or vy1 <= vy0:
+            return
+        # Texels of the tile (columns from the left, rows from the bottom)
+        # that are inside the axes.
+        u0 = int(np.floor((vx0 - x0) / (x1 - x0) * tw))
+        u1 = int(np.ceil((vx1 - x0) / (x1 - x0) * tw))
+        v0 = int(np.floor((vy0 - y0) / (y1 - y0) * th))
+        v1 = int(np.ceil((vy1 - y0) / (y1 - y0) * th))
+        # Display the whole texels, slightly overflowing the axes.
+        vx0 = x0 + u0 * (x1 - x0) / tw
+        vx1 = x0 + u1 * (x1 - x0) / tw
+        vy0 = y0 + v0 * (y1 - y0) / th
+        vy1 = y0 + v1 * (y1 - y0) / th
+        bottom_up = rgba if flip_y else rgba[::-1]
+        if flip_x:
+            bottom_up = bottom_up[:, ::-1]
+        if hasattr(renderer, 'texture_from_rgba'):
+            texture = self._textures.pop(key, None)
+            if texture is None:
+                texture = renderer.texture_from_rgba(bottom_up)
+            else:
+                # Kept from a previous render, accounted again in the
+                # texture budget of this one.
+                renderer.account_texture('image', texture)
+            self._textures[key] = texture
+            while len(self._textures) > max(len(self.cache), 1):
+                self._textures.popitem(last=False)
+            renderer.draw_texture(gc, texture.get_region(u0, v0, u1 - u0,
+                                                         v1 - v0),
+                                  vx0, vy0, vx1 - vx0, vy1 - vy0)
+        else:
+            crop = bottom_up[v0:v1, u0:u1]
+            w = max(int(round(vx1 - vx0)), 1)
+            h = max(int(round(vy1 - vy0)), 1)
+            rows = (np.arange(h) * crop.shape[0] // h)
+            cols = (np.arange(w) * crop.shape[1] // w)
+            renderer.draw_image(gc, vx0, vy0,
+                                np.ascontiguousarray(crop[rows][:, cols]))
+
+    def drop_textures(self):
+        '''Forget the textures of the tiles, e.g. when the canvas evicts its
+           render. The tiles are uploaded again by the next draw.
+        '''
+        self._textures.clear()
+
+    def remove(self):
+        self._stop_loader()
+        Artist.remove(self)
@@ -0,0 +1,307 @@
+'''
+Triangulate
+=====
+
+Triangulation of the polygons filled by :class:`backend_kivy.RendererKivy`,
+vectorized with numpy. Rectangles and convex polygons, the most common faces
+of a figure, are split in a fan without any test. Other simple polygons are
+triangulated by ear clipping: at each round all the ears are found at once
+and the ears that are not adjacent are clipped together, so a polygon of n
+vertices takes far fewer than n rounds.
+
+The triangles depend only on the shape of a polygon, so they are cached by
+shape relative to the first vertex and reused when the same face is drawn
+again, even translated. Polygons the ear clipping cannot handle, self
+intersecting ones or when the summed areas of the triangles do not match the
+area of the polygon, are given to a fallback, the kivy Tesselator in the
+backend, and are drawn as a fan if it fails too: geometry is never dropped.
+'''
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import OrderedDict
+
+import numpy as np
+
+# Mesh indices are unsigned shorts.
+MAX_VERTICES = 65535
+
+
+class TriangleMeshes(object):
+    '''Meshes of a polygon in the format of
+       :attr:`kivy.graphics.tesselator.Tesselator.meshes`: a list of
+       (vertices, indices) with vertices as x, y, u, v. `mode` is the mode of
+       the kivy Mesh to draw them with.
+    '''
+
+    def __init__(self, meshes, mode='triangles'):
+        self.meshes = meshes
+        self.mode = mode
+
+
+def clean_polygon(points):
+    '''Return the (n, 2) float array of the polygon without the closing
+       vertex and without repeated consecutive vertices.
+    '''
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) > 1:
+        keep = np.any(points != np.roll(points, 1, axis=0), axis=1)
+        keep[0] = True
+        points = points[keep]
+        if len(points) > 1 and np.array_equal(points[0], points[-1]):
+            points = points[:-1]
+    return points
+
+
+def signed_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _turns(points, orientation):
+    '''Cross product at each vertex of the incoming and outgoing edges,
+       positive for convex vertices of a polygon of the given orientation.
+    '''
+    prev = np.roll(points, 1, axis=0)
+    nxt = np.roll(points, -1, axis=0)
+    a = points - prev
+    b = nxt - points
+    return orientation * (a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0])
+
+
+def is_rectangle(points):
+    '''Return whether the polygon is a rectangle with axis aligned edges.'''
+    if len(points) != 4:
+        return False
+    edges = np.roll(points, -1, axis=0) - points
+    return bool(np.all((edges[:, 0] == 0) != (edges[:, 1] == 0)))
+
+
+def is_convex(points, turns=None):
+    '''Return whether the polygon is convex and not self intersecting.'''
+    if turns is None:
+        turns = _turns(points, np.sign(signed_area(points)) or 1.0)
+    if np.any(turns < 0):
+        return False
+    # A convex looking polygon winding more than once is a star.
+    edges = np.roll(points, -1, axis=0) - points
+    angles = np.arctan2(edges[:, 1], edges[:, 0])
+    turning = np.diff(np.concatenate((angles, angles[:1])))
+    turning = (turning + np.pi) % (2 * np.pi) - np.pi
+    return abs(abs(turning.sum()) - 2 * np.pi) < 1e-6
+
+
+def is_simple(points):
+    '''Return whether no two non adjacent edges of the polygon cross. Only
+       the pairs of edges whose x ranges overlap are tested, found by
+       bisection in the edges sorted by their left end.
+    '''
+    n = len(points)
+    if n < 4:
+        return True
+    starts = points
+    ends = np.roll(points, -1, axis=0)
+    left = np.minimum(starts[:, 0], ends[:, 0])
+    right = np.maximum(starts[:, 0], ends[:, 0])
+    order = np.argsort(left, kind='mergesort')
+    sorted_left = left[order]
+    # Edges after each edge in the order and starting within its x range.
+    lo = np.arange(1, n)
+    hi = np.searchsorted(sorted_left, right[order[:-1]], side='right')
+    counts = np.maximum(hi - lo, 0)
+    if not counts.sum():
+        return True
+    i = np.repeat(order[:-1], counts)
+    offsets = np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts,
+                                            counts)
+    j = order[np.repeat(lo, counts) + offsets]
+    apart = ((i - j) % n != 1) & ((j - i) % n != 1)
+    i, j = i[apart], j[apart]
+
+    def side(a, b, p):
+        return (b[:, 0] - a[:, 0]) * (p[:, 1] - a[:, 1]) - \
+            (b[:, 1] - a[:, 1]) * (p[:, 0] - a[:, 0])
+
+    p1, p2, q1, q2 = starts[i], ends[i], starts[j], ends[j]
+    crossing = (side(q1, q2, p1) * side(q1, q2, p2) < 0) & \
+        (side(p1, p2, q1) * side(p1, p2, q2) < 0)
+    return not crossing.any()
+
+
+def fan(n):
+    '''Triangles of a fan around the first of n vertices.'''
+    i = np.arange(1, n - 1)
+    return np.column_stack((np.zeros(n - 2, dtype=np.int64), i, i + 1))
+
+
+def _independent(ears):
+    '''Select ears such that no two selected vertices are adjacent.'''
+    n = len(ears)
+    idx = np.arange(n)
+    if ears.all():
+        keep = idx % 2 == 0
+        if n % 2:
+            keep[-1] = False
+        return keep
+    shift = int(np.argmin(ears))
+    rolled = np.roll(ears, -shift)
+    last_gap = np.maximum.accumulate(np.where(rolled, 0, idx))
+    keep = rolled & ((idx - last_gap) % 2 == 1)
+    return np.roll(keep, shift)
+
+
+def _blocked(points, candidates, tests, orientation):
+    '''Return for each candidate ear whether one of the vertices `tests`
+       lies inside or on its triangle. Only the vertices inside the x range
+       of a triangle are tested, found by bisection in the sorted tests.
+    '''
+    n = len(points)
+    blocked = np.zeros(len(candidates), dtype=bool)
+    if not len(tests) or not len(candidates):
+        return blocked
+    tests = tests[np.argsort(points[tests, 0], kind='mergesort')]
+    tx = points[tests, 0]
+    corners = [points[(candidates - 1) % n], points[candidates],
+               points[(candidates + 1) % n]]
+    xs = np.column_stack([c[:, 0] for c in corners])
+    lo = np.searchsorted(tx, xs.min(axis=1), side='left')
+    hi = np.searchsorted(tx, xs.max(axis=1), side='right')
+    counts = hi - lo
+    pairs = np.repeat(np.arange(len(candidates)), counts)
+    if not len(pairs):
+        return blocked
+    offsets = np.arange(len(pairs)) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+    p = points[tests[np.repeat(lo, counts) + offsets]]
+    inside = np.ones(len(pairs), dtype=bool)
+    for a, b in ((0, 1), (1, 2), (2, 0)):
+        pa = corners[a][pairs]
+        pb = corners[b][pairs]
+        cross = (pb[:, 0] - pa[:, 0]) * (p[:, 1] - pa[:, 1]) - \
+            (pb[:, 1] - pa[:, 1]) * (p[:, 0] - pa[:, 0])
+        inside &= orientation * cross >= 0
+    for corner in corners:
+        inside &= np.any(p != corner[pairs], axis=1)
+    blocked[pairs[inside]] = True
+    return blocked
+
+
+def ear_clip(points):
+    '''Return the (n - 2, 3) triangles of the simple polygon `points`, as
+       indices of its vertices, or None if the polygon could not be
+       triangulated, e.g. because it is self intersecting.
+    '''
+    n = len(points)
+    orientation = np.sign(signed_area(points))
+    if orientation == 0 or not is_simple(points):
+        return None
+    remaining = np.arange(n)
+    triangles = []
+    while len(remaining) > 3:
+        pts = points[remaining]
+        turns = _turns(pts, orientation)
+        flat = turns == 0
+        convex = turns > 0
+        ears = flat.copy()
+        candidates = np.nonzero(convex)[0]
+        reflex = np.nonzero(~convex)[0]
+        ears[candidates] = ~_blocked(pts, candidates, reflex, orientation)
+        if not ears.any():
+            return None
+        clip = _independent(ears)
+        emit = np.nonzero(clip & ~flat)[0]
+        m = len(remaining)
+        triangles.append(np.column_stack((remaining[(emit - 1) % m],
+                                          remaining[emit],
+                                          remaining[(emit + 1) % m])))
+        remaining = remaining[~clip]
+    if len(remaining) == 3:
+        triangles.append(remaining[None, :])
+    if not triangles:
+        return np.zeros((0, 3), dtype=np.int64)
+    triangles = np.concatenate(triangles)
+    # The triangles of a simple polygon cover its area exactly once; a
+    # remaining crossing shows as reversed or overlapping triangles.
+    a, b, c = (points[triangles[:, k]] for k in range(3))
+    areas = 0.5 * np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) -
+                         (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]))
+    area = abs(signed_area(points))
+    if abs(areas.sum() - area) > 1e-9 * max(area, 1.0) * n:
+        return None
+    return triangles
+
+
+def triangle_meshes(points, triangles):
+    '''Return the TriangleMeshes drawing the triangles of points.'''
+    if not len(triangles):
+        return TriangleMeshes([])
+    xyuv = np.zeros((len(points), 4))
+    xyuv[:, :2] = points
+    if len(points) <= MAX_VERTICES:
+        return TriangleMeshes([(xyuv.ravel().tolist(),
+                                triangles.ravel().tolist())])
+    # Too many vertices to be indexed, give each chunk its own copy.
+    meshes = []
+    step = MAX_VERTICES // 3
+    for start in range(0, len(triangles), step):
+        chunk = triangles[start:start + step].ravel()
+        meshes.append((xyuv[chunk].ravel().tolist(),
+                       list(range(len(chunk)))))
+    return TriangleMeshes(meshes)
+
+
+class Triangulator(object):
+    '''Triangulate polygons with a cache of the triangles of the last
+       `max_entries` shapes. `fallback` is called with the (n, 2) vertices of
+       the polygons the ear clipping failed on and returns
+       Tesselator-like meshes to draw as triangle fans, or None. The counters
+       of each path taken are in `stats`.
+    '''
+
+    def __init__(self, max_entries=4096, fallback=None):
+        self.max_entries = max_entries
+        self.fallback = fallback
+        self._cache = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'rectangle': 0, 'convex': 0,
+                      'ear_clip': 0, 'fallback': 0, 'fan': 0}
+
+    def triangulate(self, points):
+        '''Return the :class:`TriangleMeshes` of the polygon `points`.'''
+        points = clean_polygon(points)
+        if len(points) < 3:
+            return TriangleMeshes([])
+        key = (points - points[0]).astype(np.float32).tobytes()
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            self.stats['misses'] += 1
+            entry = self._triangles(points)
+        else:
+            self.stats['hits'] += 1
+        self._cache[key] = entry
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        kind, triangles = entry
+        self.stats[kind] += 1
+        if kind == 'fallback':
+            meshes = self.fallback(points)
+            if meshes is not None:
+                return TriangleMeshes(meshes, mode='triangle_fan')
+            self.stats['fallback'] -= 1
+            self.stats['fan'] += 1
+            triangles = fan(len(points))
+        return triangle_meshes(points, triangles)
+
+    def _triangles(self, points):
+        n = len(points)
+        if n == 3 or is_rectangle(points):
+            return 'rectangle' if n == 4 else 'convex', fan(n)
+        orientation = np.sign(signed_area(points)) or 1.0
+        if is_convex(points, _turns(points, orientation)):
+            return 'convex', fan(n)
+        triangles = ear_clip(points)
+        if triangles is not None:
+            return 'ear_clip', triangles
+        if self.fallback is not None:
+            return 'fallback', None
+        return 'fan', fan(n)